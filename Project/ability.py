@@ -0,0 +1,88 @@
+"""Online ability estimate for level placement (logistic IRT, EAP on a grid).
+
+Levels are item difficulties 0..n-1 on the ability scale and a graded answer is partial credit
+y = score/10 with P(success) = sigmoid(DISCRIMINATION * (ability - difficulty)). That likelihood
+only depends on the summed credit and the answer count per level, so the estimate is a small
+fixed-size record — prior centre plus two numbers per level — updated after every graded answer.
+The posterior mean and spread are computed over a grid on demand; with no one-step approximation a
+learner who aces (or fails) everything moves several levels per batch. Plain floats: numpy is not
+a dependency here and the grid is a few hundred points."""
+import math
+
+DISCRIMINATION = 1.7   # slope of P(success) per level of ability above the item's difficulty
+PRIOR_SD = 2.5         # wide: the level picked at intake is often several levels off
+FORGETTING = 0.98      # per answer, so the estimate follows a learner who improves
+CALIBRATED_SD = 0.6    # below this the placement is settled and the calibration phase ends
+# Place learners where they are expected to score ~7.5/10 — the middle of the old
+# stay band (demote below 6.5, promote at 8.5).
+TARGET_SUCCESS = 0.75
+GRID_STEP = 0.05
+
+
+def _target_offset() -> float:
+    """How far above an item's difficulty a learner must be to reach TARGET_SUCCESS on it."""
+    return math.log(TARGET_SUCCESS / (1 - TARGET_SUCCESS)) / DISCRIMINATION
+
+
+def expected(theta: float, difficulty: float) -> float:
+    return 1 / (1 + math.exp(-DISCRIMINATION * (theta - difficulty)))
+
+
+def prior(level_index: int, n_levels: int) -> dict:
+    return {"prior": level_index + _target_offset(), "credit": [0.0] * n_levels, "answers": [0.0] * n_levels}
+
+
+def update(est: dict, level_index: int, scores) -> dict:
+    """Estimate after graded answers (0-10 each) to items at `level_index`; `est` is not modified."""
+    credit, answers = list(est["credit"]), list(est["answers"])
+    for score in scores:
+        credit = [c * FORGETTING for c in credit]
+        answers = [a * FORGETTING for a in answers]
+        credit[level_index] += min(max(score / 10, 0.0), 1.0)
+        answers[level_index] += 1
+    return {"prior": est["prior"], "credit": credit, "answers": answers}
+
+
+def posterior(est: dict) -> tuple[float, float]:
+    """Posterior mean and standard deviation of ability."""
+    n_levels = len(est["credit"])
+    lo, hi = -2.0, n_levels + 2.0
+    grid = [lo + i * GRID_STEP for i in range(int((hi - lo) / GRID_STEP) + 1)]
+    observed = [(d, c, a) for d, (c, a) in enumerate(zip(est["credit"], est["answers"])) if a > 0]
+    logp = []
+    for theta in grid:
+        lp = -0.5 * ((theta - est["prior"]) / PRIOR_SD) ** 2
+        for d, c, a in observed:
+            z = DISCRIMINATION * (theta - d)
+            # log sigmoid(z) and log sigmoid(-z), computed stably
+            log_p = -math.log1p(math.exp(-z)) if z > 0 else z - math.log1p(math.exp(z))
+            lp += c * log_p + (a - c) * (log_p - z)
+        logp.append(lp)
+    top = max(logp)
+    weights = [math.exp(lp - top) for lp in logp]
+    total = sum(weights)
+    mean = sum(w * t for w, t in zip(weights, grid)) / total
+    var = sum(w * (t - mean) ** 2 for w, t in zip(weights, grid)) / total
+    return mean, math.sqrt(var)
+
+
+def placement(est: dict) -> float:
+    """Continuous level index where the learner is expected to score TARGET_SUCCESS."""
+    return posterior(est)[0] - _target_offset()
+
+
+def level_index(est: dict) -> int:
+    return min(max(round(placement(est)), 0), len(est["credit"]) - 1)
+
+
+def calibrated(est: dict) -> bool:
+    return posterior(est)[1] <= CALIBRATED_SD
+
+
+def clearly_elsewhere(est: dict, current: int) -> bool:
+    """True while calibrating if the learner is confidently at least one level away from `current`,
+    so the rest of a batch at `current` would tell the estimator little."""
+    mean, sd = posterior(est)
+    if sd <= CALIBRATED_SD or level_index(est) == current:
+        return False
+    return abs(mean - _target_offset() - current) >= 0.5 + sd
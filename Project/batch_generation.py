@@ -0,0 +1,188 @@
+"""Offline bulk generation for the question bank via JSONL batch jobs.
+
+    prepare  write one chat-completions request line per (subject, level, copy) in OpenAI Batch format
+    run      execute the request file with an executor (local thread pool, or the OpenAI Batch API);
+             requests whose custom_id already has a result line are skipped, so an interrupted run resumes
+    ingest   validate the result lines into QAItems, drop repeats/paraphrases, and add them to the bank
+
+Run:
+    python Project/batch_generation.py prepare --subjects astronomy physics --per-pair 4
+    python Project/batch_generation.py run --executor local --workers 16
+    python Project/batch_generation.py ingest
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+
+import prototype_code_final as ta
+from question_bank import QuestionBank
+from seen_index import SeenIndex
+
+JOB_DIR = "batch_jobs"
+ENDPOINT = "/v1/chat/completions"
+
+
+def _custom_id(subject: str, level: str, copy: int) -> str:
+    return json.dumps([subject, level, copy], ensure_ascii=False)
+
+
+def prepare(path: str, subjects: list[str], levels: list[str], per_pair: int) -> int:
+    """Write the request file; returns the number of request lines."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for subject in subjects:
+            for level in levels:
+                prompt = ta._generation_prompt(subject, level).content
+                for copy in range(per_pair):
+                    body = {"model": ta.generator_llm.model_name,
+                            "temperature": ta.generator_llm.temperature,
+                            "response_format": {"type": "json_object"},
+                            "messages": [{"role": "system", "content": prompt}]}
+                    f.write(json.dumps({"custom_id": _custom_id(subject, level, copy), "method": "POST",
+                                        "url": ENDPOINT, "body": body}, ensure_ascii=False) + "\n")
+                    n += 1
+    return n
+
+
+def _read_jsonl(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue    # a truncated last line from an interrupted run
+    return rows
+
+
+def _done_ids(results_path: str) -> set[str]:
+    return {r["custom_id"] for r in _read_jsonl(results_path) if r.get("error") is None}
+
+
+def pending_requests(requests_path: str, results_path: str) -> list[dict]:
+    done = _done_ids(results_path)
+    return [r for r in _read_jsonl(requests_path) if r["custom_id"] not in done]
+
+
+class LocalExecutor:
+    """Runs request lines through the in-process generator client on a thread pool and appends
+    result lines in the OpenAI Batch output format as they finish."""
+
+    def __init__(self, workers: int = 8):
+        self.workers = workers
+
+    def run(self, requests: list[dict], results_path: str) -> None:
+        lock = Lock()
+        with open(results_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(self._call, r): r for r in requests}
+            for i, fut in enumerate(as_completed(futures), 1):
+                line = fut.result()
+                with lock:
+                    out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    out.flush()
+                print(f"\r{i}/{len(requests)} requests", end="", flush=True)
+        print()
+
+    @staticmethod
+    def _call(request: dict) -> dict:
+        prompt = request["body"]["messages"][0]["content"]
+        try:
+            content = ta._llm_invoke(ta.generator_llm, [ta.SystemMessage(content=prompt)], "generator_batch")
+        except Exception as e:
+            return {"id": str(uuid.uuid4()), "custom_id": request["custom_id"], "response": None,
+                    "error": {"message": f"{type(e).__name__}: {e}"}}
+        return {"id": str(uuid.uuid4()), "custom_id": request["custom_id"], "error": None,
+                "response": {"status_code": 200,
+                             "body": {"choices": [{"message": {"role": "assistant", "content": content}}]}}}
+
+
+class OpenAIBatchExecutor:
+    """Submits the pending lines to the OpenAI Batch API, polls until the batch ends, and appends
+    its output lines to the results file."""
+
+    def __init__(self, poll_seconds: float = 30.0):
+        from openai import OpenAI
+        self.client = OpenAI()
+        self.poll_seconds = poll_seconds
+
+    def run(self, requests: list[dict], results_path: str) -> None:
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in requests).encode("utf-8")
+        upload = self.client.files.create(file=("requests.jsonl", payload), purpose="batch")
+        batch = self.client.batches.create(input_file_id=upload.id, endpoint=ENDPOINT, completion_window="24h")
+        print(f"Submitted batch {batch.id} ({len(requests)} requests)")
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(self.poll_seconds)
+            batch = self.client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"\r{batch.status}: {counts.completed}/{counts.total}", end="", flush=True)
+        print()
+        # expired/cancelled batches still return the lines that did finish
+        if batch.output_file_id:
+            text = self.client.files.content(batch.output_file_id).text
+            with open(results_path, "a", encoding="utf-8") as out:
+                out.write(text if text.endswith("\n") else text + "\n")
+
+
+def ingest(results_path: str, bank: QuestionBank) -> dict[tuple[str, str], int]:
+    """Add every valid, non-duplicate item from the results file to the bank; returns items added per pool."""
+    indexes: dict[tuple[str, str], SeenIndex] = {}
+    added: dict[tuple[str, str], int] = {}
+    seen_ids: set[str] = set()
+    for row in _read_jsonl(results_path):
+        if row.get("error") is not None or row["custom_id"] in seen_ids:
+            continue
+        seen_ids.add(row["custom_id"])
+        subject, level, _ = json.loads(row["custom_id"])
+        try:
+            content = row["response"]["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            continue
+        index = indexes.get((subject, level))
+        if index is None:
+            # seeded with the pool, so paraphrases of items ingested by earlier runs are skipped too
+            index = indexes[(subject, level)] = SeenIndex()
+            for question in bank.questions(subject, level):
+                index.add(question)
+        items = ta._parse_items(content, index, limit=10**6)
+        added[(subject, level)] = added.get((subject, level), 0) + bank.add(subject, level, items)
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("prepare", "run", "ingest"))
+    parser.add_argument("--requests", default=os.path.join(JOB_DIR, "question_requests.jsonl"))
+    parser.add_argument("--results", default=os.path.join(JOB_DIR, "question_results.jsonl"))
+    parser.add_argument("--subjects", nargs="+", default=[])
+    parser.add_argument("--levels", nargs="+", default=ta.LEVELS, help="default: all levels")
+    parser.add_argument("--per-pair", type=int, default=4, help="requests per (subject, level)")
+    parser.add_argument("--executor", choices=("local", "openai"), default="local")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--bank", default=ta.QUESTION_BANK_PATH or "question_bank.sqlite3")
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        unknown = [lvl for lvl in args.levels if lvl not in ta.LEVELS]
+        if unknown or not args.subjects:
+            parser.error(f"need --subjects and valid --levels (unknown: {unknown})")
+        print(f"Wrote {prepare(args.requests, args.subjects, args.levels, args.per_pair)} requests to {args.requests}")
+    elif args.command == "run":
+        todo = pending_requests(args.requests, args.results)
+        print(f"{len(todo)} requests pending")
+        if todo:
+            executor = LocalExecutor(args.workers) if args.executor == "local" else OpenAIBatchExecutor()
+            executor.run(todo, args.results)
+    else:
+        added = ingest(args.results, QuestionBank(args.bank))
+        for (subject, level), n in sorted(added.items()):
+            print(f"{subject} / {level}: +{n}")
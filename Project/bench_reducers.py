@@ -0,0 +1,41 @@
+"""Micro-benchmark: per-update cost of list-concatenating reducers vs. the reducers in reducers.py.
+
+Run: python Project/bench_reducers.py
+"""
+import time
+
+from reducers import append, append_unique
+
+
+def extend_list(existing, new):
+    ex = existing if existing else []
+    nw = new if new else []
+    return ex + nw
+
+
+def append_notes(existing, new):
+    ex = list(existing) if existing else []
+    nw = list(new) if new else []
+    for n in nw:
+        if n and n not in ex:
+            ex.append(n)
+    return ex
+
+
+def us_per_update(reducer, size: int, make_item, samples: int = 200) -> float:
+    """Grow a channel to `size` entries, then time `samples` single-item updates."""
+    value = reducer(None, [make_item(i) for i in range(size)])
+    start = time.perf_counter()
+    for i in range(samples):
+        value = reducer(value, [make_item(size + i)])
+    return (time.perf_counter() - start) / samples * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'entries':>8} | {'ex + nw':>10} {'append':>10} | {'append_notes':>12} {'append_unique':>13}   (µs/update)")
+    for size in (10**2, 10**3, 10**4, 10**5):
+        print(f"{size:>8} | "
+              f"{us_per_update(extend_list, size, lambda i: {'q_id': i}):>10.2f} "
+              f"{us_per_update(append, size, lambda i: {'q_id': i}):>10.2f} | "
+              f"{us_per_update(append_notes, size, str, samples=20):>12.2f} "
+              f"{us_per_update(append_unique, size, str):>13.2f}")
@@ -0,0 +1,162 @@
+"""Cohort analytics over the columnar response log (response_log.py).
+
+    levels      score distribution per level (n, mean, p10/p50/p90, histogram 0..10)
+    items       item difficulty: mean score per question, relative to its level's mean
+    promotions  how often a learner's run of answers at a level ends in a promotion or demotion
+    synth       append N synthetic rows, for timing the other commands at scale
+
+Every command scans the memory-mapped columns directly (no per-row dicts, no pandas).
+
+Run:
+    python Project/cohort_analytics.py levels
+    python Project/cohort_analytics.py items --top 20 --min-answers 30
+    python Project/cohort_analytics.py synth --rows 5000000 --log /tmp/response_log
+"""
+from collections import Counter
+import argparse
+import random
+import time
+
+from response_log import ColumnReader, ResponseLog
+
+LEVEL_NAMES = ("Elementary School", "Middle School", "High School", "Undergraduate",
+               "Advanced Undergraduate", "Graduate", "Advanced Graduate")
+
+
+def _level_name(i: int) -> str:
+    return LEVEL_NAMES[i] if i < len(LEVEL_NAMES) else str(i)
+
+
+def _quantile(hist: list[int], q: float) -> int:
+    target, seen = q * sum(hist), 0
+    for score, count in enumerate(hist):
+        seen += count
+        if seen >= target:
+            return score
+    return len(hist) - 1
+
+
+def _select(reader: ColumnReader, subject: str | None) -> tuple:
+    """The level and score columns, restricted to one subject if given."""
+    levels, scores = reader["level"], reader["score"]
+    if subject is None:
+        return levels, scores
+    code = reader.dictionary("subject").index(subject)
+    keep = [i for i, s in enumerate(reader["subject"]) if s == code]
+    return [levels[i] for i in keep], [scores[i] for i in keep]
+
+
+def score_distributions(reader: ColumnReader, subject: str | None = None) -> dict[int, list[int]]:
+    """level -> histogram of scores 0..10."""
+    levels, scores = _select(reader, subject)
+    hists: dict[int, list[int]] = {}
+    for (level, score), count in Counter(zip(levels, scores)).items():
+        hists.setdefault(level, [0] * 11)[score] += count
+    return hists
+
+
+def item_difficulty(reader: ColumnReader) -> dict[int, tuple[int, int, float]]:
+    """q_id code -> (level, answers, mean score)."""
+    totals: dict[int, list[int]] = {}
+    for (q, level, score), count in Counter(zip(reader["q_id"], reader["level"], reader["score"])).items():
+        t = totals.setdefault(q, [level, 0, 0])
+        t[1] += count
+        t[2] += score * count
+    return {q: (level, n, s / n) for q, (level, n, s) in totals.items()}
+
+
+def promotion_rates(reader: ColumnReader) -> dict[int, Counter]:
+    """level -> Counter of how runs at that level ended: "promoted", "demoted" or "stayed" (still
+    at that level at the learner's last recorded answer)."""
+    outcomes: dict[int, Counter] = {}
+    current: dict[int, int] = {}
+    for learner, level in zip(reader["learner"], reader["level"]):
+        prev = current.get(learner)
+        if prev != level:
+            if prev is not None:
+                outcomes.setdefault(prev, Counter())["promoted" if level > prev else "demoted"] += 1
+            current[learner] = level
+    for level in current.values():
+        outcomes.setdefault(level, Counter())["stayed"] += 1
+    return outcomes
+
+
+def synthesize(path: str, rows: int, learners: int = 10_000, items_per_level: int = 2_000) -> None:
+    log = ResponseLog(path, flush_every=65_536)
+    ability = {i: random.gauss(3, 1.5) for i in range(learners)}
+    level = {i: random.randrange(7) for i in range(learners)}
+    answered = {i: 0 for i in range(learners)}
+    for _ in range(rows):
+        learner = random.randrange(learners)
+        lvl = level[learner]
+        p = 1 / (1 + 2.718 ** (-1.7 * (ability[learner] - lvl)))
+        score = max(0, min(10, round(random.gauss(10 * p, 1.5))))
+        log.append(f"learner-{learner}", "astronomy", lvl, f"q{lvl}-{random.randrange(items_per_level)}",
+                   score, random.uniform(50, 900), random.choice((0, 0, 180, 240)))
+        answered[learner] += 1
+        if answered[learner] % 5 == 0:    # end of a batch: move toward the learner's level
+            level[learner] = min(6, max(0, round(ability[learner] - 0.65)))
+    log.close()
+
+
+def _print_levels(reader: ColumnReader, subject: str | None) -> None:
+    print(f"{'level':<24}{'n':>10}{'mean':>7}{'p10':>5}{'p50':>5}{'p90':>5}  histogram 0..10 (% of answers)")
+    for level, hist in sorted(score_distributions(reader, subject).items()):
+        n = sum(hist)
+        mean = sum(s * c for s, c in enumerate(hist)) / n
+        bars = " ".join(f"{100 * c / n:3.0f}" for c in hist)
+        print(f"{_level_name(level):<24}{n:>10}{mean:>7.2f}"
+              f"{_quantile(hist, 0.1):>5}{_quantile(hist, 0.5):>5}{_quantile(hist, 0.9):>5}  {bars}")
+
+
+def _print_items(reader: ColumnReader, top: int, min_answers: int) -> None:
+    items = item_difficulty(reader)
+    level_mean: dict[int, list[float]] = {}
+    for level, n, mean in items.values():
+        acc = level_mean.setdefault(level, [0.0, 0])
+        acc[0] += mean * n
+        acc[1] += n
+    # positive: harder than the typical question at its level
+    rated = [(level_mean[level][0] / level_mean[level][1] - mean, q, level, n, mean)
+             for q, (level, n, mean) in items.items() if n >= min_answers]
+    rated.sort(reverse=True)
+    names = reader.dictionary("q_id")
+    print(f"{len(items)} questions, {len(rated)} with >= {min_answers} answers")
+    for title, rows in (("hardest", rated[:top]), ("easiest", rated[::-1][:top])):
+        print(f"\n{title}:\n{'q_id':<40}{'level':<24}{'n':>7}{'mean':>7}{'vs level':>10}")
+        for delta, q, level, n, mean in rows:
+            print(f"{names[q]:<40}{_level_name(level):<24}{n:>7}{mean:>7.2f}{-delta:>+10.2f}")
+
+
+def _print_promotions(reader: ColumnReader) -> None:
+    print(f"{'level':<24}{'runs':>9}{'promoted':>10}{'demoted':>10}{'stayed':>10}")
+    for level, c in sorted(promotion_rates(reader).items()):
+        n = sum(c.values())
+        print(f"{_level_name(level):<24}{n:>9}" + "".join(f"{100 * c[k] / n:>9.1f}%" for k in ("promoted", "demoted", "stayed")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("levels", "items", "promotions", "synth"))
+    parser.add_argument("--log", default="response_log", help="response log directory")
+    parser.add_argument("--subject", default=None, help="levels: restrict to one (normalized) subject")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-answers", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    start = time.perf_counter()
+    if args.command == "synth":
+        synthesize(args.log, args.rows)
+        print(f"appended {args.rows} rows to {args.log} in {time.perf_counter() - start:.1f}s")
+    else:
+        with ColumnReader(args.log) as reader:
+            if args.command == "levels":
+                _print_levels(reader, args.subject)
+            elif args.command == "items":
+                _print_items(reader, args.top, args.min_answers)
+            else:
+                _print_promotions(reader)
+            print(f"\n{reader.rows} rows in {time.perf_counter() - start:.2f}s")
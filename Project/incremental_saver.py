@@ -0,0 +1,271 @@
+"""SQLite checkpointer that writes only what changed.
+
+Stock savers re-serialize every channel on every step, so a step's write grows with the session
+(`batch`, `seen_questions`, `messages`, `responses` ...). Here each checkpoint row stores only
+channel versions; channel values live in a `blobs` table keyed by (channel, version) and are
+written only for the channels in `new_versions`. Append-only channels (lists, AppendLogs) and
+grow-only dicts are additionally stored as deltas against the channel's previous version, so
+appending one response writes one response. Every FULL_SNAPSHOT_EVERY deltas a channel is
+written in full again, which bounds the chain a cold load has to replay.
+
+The delta base (each channel's last written value) is kept in memory only for the
+MAX_CACHED_THREADS most recently used threads; a thread that fell out of that LRU writes its next
+step in full, so an idle session costs nothing in this process."""
+from collections import OrderedDict
+from collections.abc import Sequence
+import asyncio
+import random
+import sqlite3
+import threading
+
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple
+
+from reducers import AppendLog
+
+FULL_SNAPSHOT_EVERY = 64
+MAX_CACHED_THREADS = 256
+
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    kind TEXT NOT NULL, base_version TEXT, type TEXT, blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version));
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));
+"""
+
+_MISSING = object()
+
+
+def _sequence_tail(old, new) -> list | None:
+    """Items appended to `old` to get `new`, or None if `new` does not extend `old`."""
+    if not isinstance(old, Sequence) or not isinstance(new, Sequence) or isinstance(new, (str, bytes)):
+        return None
+    if len(new) < len(old):
+        return None
+    if isinstance(old, AppendLog) and isinstance(new, AppendLog) and old._buf is new._buf:
+        return new[len(old):]     # same backing buffer: the prefix is shared by construction
+    if any(a is not b for a, b in zip(old, new)):
+        return None
+    return list(new[len(old):])
+
+
+def _dict_additions(old, new) -> dict | None:
+    """Keys added to `old` to get `new`, or None if any existing entry changed or was removed."""
+    if not isinstance(old, dict) or not isinstance(new, dict) or len(new) < len(old):
+        return None
+    if any(new.get(k, _MISSING) is not v for k, v in old.items()):
+        return None
+    return {k: v for k, v in new.items() if k not in old}
+
+
+def _set_additions(old, new) -> list | None:
+    """Members added to `old` to get `new`, or None if `new` is not a superset of `old`."""
+    if not isinstance(old, (set, frozenset)) or not isinstance(new, (set, frozenset)) or not old <= new:
+        return None
+    return list(new - old)
+
+
+class IncrementalSqliteSaver(BaseCheckpointSaver):
+    """Drop-in checkpointer for `graph.compile(checkpointer=...)`; sync and async APIs."""
+
+    def __init__(self, path: str, *, serde=None, max_cached_threads: int = MAX_CACHED_THREADS):
+        super().__init__(serde=serde)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.max_cached_threads = max_cached_threads
+        # LRU of (thread_id, ns) -> {channel: (version, value, deltas since full snapshot)}: the delta bases
+        self._last: OrderedDict[tuple[str, str], dict[str, tuple[str, object, int]]] = OrderedDict()
+        self._last_lock = threading.Lock()
+
+    def _delta_bases(self, thread_id: str, ns: str) -> dict[str, tuple[str, object, int]]:
+        key = (thread_id, ns)
+        with self._last_lock:
+            bases = self._last.get(key)
+            if bases is None:
+                bases = self._last[key] = {}
+                while len(self._last) > self.max_cached_threads:
+                    self._last.popitem(last=False)
+            else:
+                self._last.move_to_end(key)
+            return bases
+
+    # ---------- writes ----------
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        values = checkpoint["channel_values"]
+        bases = self._delta_bases(thread_id, ns)
+        rows = [self._blob_row(bases, thread_id, ns, channel, str(version), values.get(channel, _MISSING))
+                for channel, version in new_versions.items()]
+        stored = {k: v for k, v in checkpoint.items() if k != "channel_values"}
+        ctype, cblob = self.serde.dumps_typed(stored)
+        mtype, mblob = self.serde.dumps_typed(dict(metadata))
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                               ctype, cblob, mtype, mblob))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def _blob_row(self, bases: dict, thread_id: str, ns: str, channel: str, version: str, value) -> tuple:
+        if value is _MISSING:
+            bases.pop(channel, None)
+            return (thread_id, ns, channel, version, "empty", None, None, None)
+        last = bases.get(channel)
+        if last is not None and last[2] < FULL_SNAPSHOT_EVERY:
+            base_version, base, depth = last
+            for kind, diff in (("seq_delta", _sequence_tail), ("dict_delta", _dict_additions),
+                               ("set_delta", _set_additions)):
+                tail = diff(base, value)
+                if tail is not None:
+                    bases[channel] = (version, value, depth + 1)
+                    return (thread_id, ns, channel, version, kind, base_version, *self.serde.dumps_typed(tail))
+        bases[channel] = (version, value, 0)
+        return (thread_id, ns, channel, version, "full", None, *self.serde.dumps_typed(value))
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # special writes (errors, interrupts) have fixed indexes and replace earlier ones
+        query = ("INSERT OR REPLACE" if all(ch in WRITES_IDX_MAP for ch, _ in writes) else "INSERT OR IGNORE")
+        rows = [(thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(ch, idx), ch, *self.serde.dumps_typed(v))
+                for idx, (ch, v) in enumerate(writes)]
+        with self._lock, self.conn:
+            self.conn.executemany(f"{query} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self.conn:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        with self._last_lock:
+            for key in [k for k in self._last if k[0] == thread_id]:
+                del self._last[key]
+
+    # ---------- reads ----------
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params = [thread_id, ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        with self._lock:
+            row = self.conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+            return self._to_tuple(row, latest=not checkpoint_id) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = "SELECT * FROM checkpoints WHERE 1 = 1"
+        params: list = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before:
+            query += " AND checkpoint_id < ?"
+            params.append(before["configurable"]["checkpoint_id"])
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+        n = 0
+        for row in rows:
+            with self._lock:
+                item = self._to_tuple(row, latest=False)
+            if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield item
+            n += 1
+            if limit is not None and n >= limit:
+                return
+
+    def _to_tuple(self, row, latest: bool) -> CheckpointTuple:
+        thread_id, ns, checkpoint_id, parent_id, ctype, cblob, mtype, mblob = row
+        checkpoint = self.serde.loads_typed((ctype, cblob))
+        checkpoint["channel_values"] = {}
+        bases = self._delta_bases(thread_id, ns) if latest else None
+        for channel, version in checkpoint["channel_versions"].items():
+            value, depth = self._load_blob(thread_id, ns, channel, str(version))
+            if value is not _MISSING:
+                checkpoint["channel_values"][channel] = value
+                if bases is not None:
+                    # later puts on this thread extend these objects: make them the delta base
+                    bases[channel] = (str(version), value, depth)
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, blob FROM writes WHERE thread_id = ? AND checkpoint_ns = ?"
+            " AND checkpoint_id = ? ORDER BY task_id, idx", (thread_id, ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": ns,
+                                             "checkpoint_id": parent_id}} if parent_id else None),
+            pending_writes=[(task_id, ch, self.serde.loads_typed((t, b))) for task_id, ch, t, b in writes],
+        )
+
+    def _load_blob(self, thread_id: str, ns: str, channel: str, version: str):
+        """Rebuild one channel value and its delta depth: walk back to the last full snapshot, then
+        replay the deltas."""
+        chain = []
+        while True:
+            row = self.conn.execute(
+                "SELECT kind, base_version, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND channel = ? AND version = ?", (thread_id, ns, channel, version)).fetchone()
+            if row is None or row[0] == "empty":
+                return _MISSING, 0
+            chain.append(row)
+            if row[0] == "full":
+                break
+            version = row[1]
+        value = self.serde.loads_typed(chain[-1][2:])
+        for kind, _, t, b in reversed(chain[:-1]):
+            delta = self.serde.loads_typed((t, b))
+            if kind == "dict_delta":
+                value = {**value, **delta}
+            elif kind == "set_delta":
+                value = value | set(delta)
+            elif isinstance(value, AppendLog):
+                value = value.extend(delta)
+            else:
+                value = list(value) + list(delta)
+        return value, len(chain) - 1
+
+    def get_next_version(self, current, channel) -> str:
+        # same scheme as the stock savers: zero-padded counter, so versions sort as strings
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---------- async API (sqlite calls run on a worker thread) ----------
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
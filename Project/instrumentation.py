@@ -0,0 +1,149 @@
+"""In-process metrics for the teaching-assistant graph: per-node wall time, LLM round trips and
+token usage, cache hits and retries. Dump with `to_json()` or `to_prometheus()`."""
+from functools import wraps
+import json
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.n += 1
+        self.total += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        target, seen = q * self.n, 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+
+_lock = threading.Lock()
+_histograms: dict[tuple[str, tuple], Histogram] = {}
+_counters: dict[tuple[str, tuple], float] = {}
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, **labels) -> None:
+    with _lock:
+        _histograms.setdefault((name, _labels(labels)), Histogram()).observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    with _lock:
+        key = (name, _labels(labels))
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def instrument_node(name: str, fn):
+    """Wrap a graph node so its wall time is recorded; interrupts and errors are counted instead."""
+    @wraps(fn)    # keeps the signature, so langgraph still passes `config` to nodes that take it
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            kind = "interrupt" if type(e).__name__ == "GraphInterrupt" else "error"
+            inc("node_exits_total", node=name, kind=kind)
+            raise
+        observe("node_seconds", time.perf_counter() - start, node=name)
+        return result
+    return wrapper
+
+
+def instrumented(graph):
+    """Make `graph.add_node(name, fn)` register an instrumented node for every later call."""
+    add_node = graph.add_node
+
+    def add_instrumented_node(node, action=None, **kwargs):
+        if action is None:  # add_node(fn) form: the node is named after the function
+            node, action = getattr(node, "__name__", str(node)), node
+        return add_node(node, instrument_node(node, action), **kwargs)
+
+    graph.add_node = add_instrumented_node
+    return graph
+
+
+def record_llm_call(role: str, seconds: float, response=None) -> None:
+    """Record one LLM round trip and, when the response carries it, its token usage."""
+    observe("llm_seconds", seconds, role=role)
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if not usage and getattr(response, "usage_metadata", None):
+        # aggregated stream chunks carry usage here instead (input/output tokens)
+        meta = response.usage_metadata
+        usage = {"prompt_tokens": meta.get("input_tokens"), "completion_tokens": meta.get("output_tokens")}
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            inc("llm_tokens_total", usage[kind], role=role, kind=kind.removesuffix("_tokens"))
+
+
+def snapshot() -> dict:
+    with _lock:
+        hists = [{"name": name, "labels": dict(labels), "count": h.n, "sum": h.total,
+                  "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                  "buckets": dict(zip(map(str, BUCKETS), h.counts))}
+                 for (name, labels), h in _histograms.items()]
+        counters = [{"name": name, "labels": dict(labels), "value": v} for (name, labels), v in _counters.items()]
+    return {"histograms": hists, "counters": counters}
+
+
+def to_json() -> str:
+    return json.dumps(snapshot(), indent=2)
+
+
+def _fmt_labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}" if items else ""
+
+
+def to_prometheus() -> str:
+    """Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for (name, labels), h in sorted(_histograms.items()):
+            labels = dict(labels)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_fmt_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.total}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.n}")
+        for (name, labels), v in sorted(_counters.items()):
+            lines.append(f"{name}{_fmt_labels(dict(labels))} {v}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_methods(obj, metric: str, *names: str):
+    """Time the given methods of one object (e.g. a checkpointer's put/put_writes) under `metric`."""
+    for method_name in names:
+        method = getattr(obj, method_name)
+
+        @wraps(method)
+        def timed(*args, _method=method, _name=method_name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                observe(metric, time.perf_counter() - start, method=_name)
+
+        setattr(obj, method_name, timed)
+    return obj
@@ -0,0 +1,93 @@
+"""SQLite-backed cache of judge grades keyed on a normalized (question, ground truth, student answer)."""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Unicode minus and dashes ("−5", "–5") mean "-"; _TOKEN would otherwise drop them and "−5" would hit "5"
+_DASHES = str.maketrans({c: "-" for c in "\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe58\ufe63\uff0d"})
+# signs and "#" are kept as tokens: "e+"/"e-", "x+y"/"x-y" and "C++"/"C" are different answers
+_TOKEN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?|[^\W\d_]+|[/^%*=<>+\-#]")
+# bump when normalize() changes, so grades stored under the old keys are no longer served
+KEY_VERSION = 2
+
+
+def _canon_number(tok: str) -> str:
+    try:
+        value = float(tok)
+    except ValueError:
+        return tok
+    if value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    return repr(value)
+
+
+def normalize(text: str) -> str:
+    """Case-fold, drop punctuation/extra whitespace and canonicalize numbers ("9.80" -> "9.8", "1,000" -> "1000")."""
+    s = unicodedata.normalize("NFKC", str(text)).translate(_DASHES).casefold()
+    s = re.sub(r"(?<=\d),(?=\d{3}\b)", "", s)
+    return " ".join(_canon_number(t) if t[0].isdigit() or t[0] in "+-." else t
+                    for t in _TOKEN.findall(s))
+
+
+class JudgeCache:
+    """Size-bounded LRU cache of (score, explanation) grades, safe to share between threads."""
+
+    def __init__(self, path: str = "judge_cache.sqlite3", max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judge_cache ("
+            " key TEXT PRIMARY KEY, score INTEGER NOT NULL, explanation TEXT NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS judge_cache_lru ON judge_cache(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM judge_cache").fetchone()[0]
+
+    @staticmethod
+    def key(question: str, ground_truth: str, student_answer: str, answer_type: str = "text") -> str:
+        parts = [normalize(question), normalize(ground_truth), normalize(student_answer), answer_type, KEY_VERSION]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, question: str, ground_truth: str, student_answer: str,
+            answer_type: str = "text") -> tuple[int, str] | None:
+        k = self.key(question, ground_truth, student_answer, answer_type)
+        with self._lock:
+            row = self._conn.execute("SELECT score, explanation FROM judge_cache WHERE key = ?", (k,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE judge_cache SET last_used = ? WHERE key = ?", (time.time_ns(), k))
+            self._conn.commit()
+        return int(row[0]), row[1]
+
+    def put(self, question: str, ground_truth: str, student_answer: str, score: int, explanation: str,
+            answer_type: str = "text") -> None:
+        k = self.key(question, ground_truth, student_answer, answer_type)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO judge_cache (key, score, explanation, last_used) VALUES (?, ?, ?, ?)",
+                (k, int(score), explanation, time.time_ns()),
+            )
+            self._size += cur.rowcount
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM judge_cache WHERE key IN "
+                    "(SELECT key FROM judge_cache ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._size -= excess
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": self._size,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
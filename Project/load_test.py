@@ -0,0 +1,203 @@
+"""Synthetic-learner load harness for the adaptive quiz loop.
+
+Runs N simulated learners concurrently through the full
+intake -> generate_batch_questions -> get_answers -> evaluate_answer -> decide_next_level -> ask_continue
+loop, with local fake LLMs (configurable latency) in place of generator_llm / judge_llm, and reports
+throughput, per-node latency percentiles, peak RSS and per-session state size. The first
+--trace-learners learners also record their checkpointed state size after every turn, to show whether
+it grows with session length (compare --message-retention all vs last_n).
+
+Run: python Project/load_test.py --learners 200 --batches 4 --gen-latency-ms 1500 --judge-latency-ms 400
+"""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import argparse
+import asyncio
+import json
+import pickle
+import random
+import resource
+import statistics
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import instrumentation as metrics
+import prototype_code_final as ta
+
+WORDS = ("orbit", "photon", "nebula", "quasar", "albedo", "parsec", "redshift", "perihelion",
+         "magnetar", "corona", "eclipse", "spectrum", "nucleus", "plasma", "zenith", "aurora")
+
+
+def _token() -> str:
+    return f"{random.choice(WORDS)}{random.randrange(16**5):05x}"
+
+
+class FakeLLM:
+    """Stand-in chat model: sleeps for a lognormal latency and returns JSON like the real prompts expect."""
+
+    def __init__(self, role: str, latency_ms: float, answers: dict[str, str]):
+        self.role = role
+        self.latency_ms = latency_ms
+        self.answers = answers      # question -> ground truth, shared with the simulated learners
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        if self.latency_ms:
+            time.sleep(random.lognormvariate(0, 0.35) * self.latency_ms / 1000)
+        prompt = "\n".join(str(m.content) for m in messages)
+        content = self._generate() if self.role == "generator" else self._judge(messages[-1].content)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                 "total_tokens": (len(prompt) + len(content)) // 4}
+        return SimpleNamespace(content=content, response_metadata={"token_usage": usage})
+
+    def _generate(self) -> str:
+        items = []
+        for _ in range(ta.BATCH_SIZE):
+            question = f"Explain term {_token()} in context {_token()} regarding {_token()}?"
+            if random.random() < 0.4:
+                answer, answer_type = str(random.randint(1, 999)), "numeric"
+            else:
+                answer, answer_type = random.choice(WORDS), "text"
+            with self._lock:
+                self.answers[question] = answer
+            items.append({"question": question, "explanation": "Synthetic.", "answer": answer, "answer_type": answer_type})
+        return json.dumps({"items": items})
+
+    def _judge(self, payload: str) -> str:
+        data = json.loads(payload)
+        if "items" in data:
+            return json.dumps({"grades": [{"q_id": it["q_id"], "score": self._score(it), "explanation": "ok"}
+                                          for it in data["items"]]})
+        return json.dumps({"score": self._score(data), "explanation": "ok"})
+
+    @staticmethod
+    def _score(item: dict) -> int:
+        return 10 if item["student_answer"].strip().lower() == item["ground_truth_answer"].lower() else random.randint(0, 6)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Records wall time of every completed graph node (interrupted node runs are skipped)."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self._starts: dict = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            self._starts[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start:
+            with self._lock:
+                self.samples.setdefault(start[0], []).append(time.perf_counter() - start[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+
+
+async def _state_bytes(thread_id: str) -> tuple[int, int]:
+    """Pickled size of the session's checkpointed state, and of its `messages` channel alone."""
+    values = (await ta.app.aget_state(ta._session_config(thread_id))).values
+    return len(pickle.dumps(values)), len(pickle.dumps(values.get("messages", [])))
+
+
+async def learner(i: int, args: argparse.Namespace, answers: dict[str, str], stats: dict) -> None:
+    thread_id = f"learner-{i}"
+    turn = await ta.astart_session(thread_id, subject="astronomy", level=random.choice(ta.LEVELS))
+    batches = 0
+    trace = stats["per_turn"].setdefault(i, []) if i < args.trace_learners else None
+    while not turn["done"]:
+        if trace is not None:
+            trace.append(await _state_bytes(thread_id))
+        prompt = turn["prompt"] or ""
+        if args.think_ms:
+            await asyncio.sleep(random.expovariate(1000 / args.think_ms))
+        if prompt.startswith("Do you want another batch"):
+            batches += 1
+            reply = "y" if batches < args.batches else "n"
+        else:
+            question = prompt.split(": ", 1)[-1].rsplit("\nYour answer:", 1)[0]
+            truth = answers.get(question, "")
+            reply = truth if random.random() < args.accuracy else _token()
+        turn = await ta.areply(thread_id, reply)
+    stats["batches"] += batches
+    snapshot = await ta.app.aget_state(ta._session_config(thread_id))
+    stats["state_bytes"].append(len(pickle.dumps(snapshot.values)))
+
+
+def percentile(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))]
+
+
+async def main(args: argparse.Namespace) -> None:
+    random.seed(args.seed)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+    answers: dict[str, str] = {}
+    ta.generator_llm = FakeLLM("generator", args.gen_latency_ms, answers)
+    ta.judge_llm = FakeLLM("judge", args.judge_latency_ms, answers)
+    ta.judge_cache = None
+    ta.question_bank = None
+    ta.response_log = None
+    ta.PREFETCH = args.prefetch
+    ta.BATCH_GRADING = args.batch_grading
+    ta.CONCURRENT_GRADING = args.concurrent_grading
+    ta.set_llm_concurrency(args.max_llm_calls)
+    ta.use_checkpointer(ta.make_checkpointer(args.checkpoint))
+    ta.MESSAGE_RETENTION = args.message_retention
+    ta.MESSAGE_HISTORY_LIMIT = args.message_limit
+    timer = NodeTimer()
+    ta.SESSION_CALLBACKS.append(timer)
+
+    stats = {"batches": 0, "state_bytes": [], "per_turn": {}}
+    start = time.perf_counter()
+    await asyncio.gather(*(learner(i, args, answers, stats) for i in range(args.learners)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{args.learners} learners x {args.batches} batches in {elapsed:.1f}s "
+          f"-> {stats['batches'] / elapsed:.2f} batches/s")
+    print(f"\n{'node':<26}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for node, xs in sorted(timer.samples.items()):
+        print(f"{node:<26}{len(xs):>7}" + "".join(f"{percentile(xs, p) * 1000:>10.1f}" for p in (50, 95, 99)))
+    print(f"\npeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    sizes = stats["state_bytes"]
+    print(f"state size per session: mean {statistics.mean(sizes) / 1024:.1f} KiB, max {max(sizes) / 1024:.1f} KiB")
+    traces = [t for t in stats["per_turn"].values() if t]
+    if traces:
+        print(f"\nstate size by turn (mean of {len(traces)} traced learners, messages={args.message_retention}):")
+        print(f"{'turn':>6}{'state KiB':>12}{'messages KiB':>15}")
+        longest = max(map(len, traces))
+        for turn in sorted({0, longest // 4, longest // 2, 3 * longest // 4, longest - 1}):
+            rows = [t[turn] for t in traces if len(t) > turn]
+            print(f"{turn + 1:>6}{statistics.mean(r[0] for r in rows) / 1024:>12.1f}"
+                  f"{statistics.mean(r[1] for r in rows) / 1024:>15.1f}")
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            f.write(metrics.to_json())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=50)
+    parser.add_argument("--batches", type=int, default=3, help="batches per learner")
+    parser.add_argument("--accuracy", type=float, default=0.6, help="probability a learner answers correctly")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean learner think time per prompt")
+    parser.add_argument("--gen-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--judge-latency-ms", type=float, default=400.0)
+    parser.add_argument("--max-llm-calls", type=int, default=ta.MAX_CONCURRENT_LLM_CALLS)
+    parser.add_argument("--workers", type=int, default=64, help="threads for running graph nodes")
+    parser.add_argument("--prefetch", action="store_true")
+    parser.add_argument("--batch-grading", action="store_true")
+    parser.add_argument("--concurrent-grading", action="store_true")
+    parser.add_argument("--checkpoint", default=None, help="SQLite file for session checkpoints (default: memory)")
+    parser.add_argument("--message-retention", choices=("all", "last_n", "none"), default=ta.MESSAGE_RETENTION)
+    parser.add_argument("--message-limit", type=int, default=ta.MESSAGE_HISTORY_LIMIT)
+    parser.add_argument("--trace-learners", type=int, default=3, help="learners whose state size is sampled every turn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--metrics-out", default=None, help="write the instrumentation snapshot (JSON) here")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""Cost-aware routing between a local CPU model and the remote chat model.
+
+A ModelRouter stands in for `generator_llm` / `judge_llm`. Callers mark a call as cheap
+(`prefer_local=True`) by rule, e.g. low-level generation or grading a short text answer. A cheap
+call goes to the local model only while that model is healthy for this role: over the last
+`window` local calls the error rate and p95 latency must be within budget. A local answer that
+fails the caller's `validate` check counts as an error and the call is retried remotely.
+`validate` can only check the shape of a reply, not its quality, so local answers are marked
+(`response_metadata["local"]`) for callers that should not persist them. While the local model
+is unhealthy, every `probe_every`-th cheap call still goes local so recovery is noticed."""
+from collections import deque
+from contextlib import nullcontext
+from types import SimpleNamespace
+import re
+import threading
+import time
+
+import instrumentation as metrics
+
+LOCAL_MODEL_ID = "Qwen/Qwen2.5-0.5B-Instruct"
+
+
+class LocalChatModel:
+    """Qwen2.5-0.5B-Instruct on CPU (as in Tutorial/Qwen_model.py), loaded on first use. One
+    generation at a time; waiting for the model counts toward the router's latency stats."""
+
+    def __init__(self, model_id: str = LOCAL_MODEL_ID, threads: int = 2):
+        self.model_id = model_id
+        self.threads = threads
+        self._model = None
+        self._tok = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        torch.set_num_threads(self.threads)
+        self._tok = AutoTokenizer.from_pretrained(self.model_id, trust_remote_code=True)
+        self._model = AutoModelForCausalLM.from_pretrained(
+            self.model_id, trust_remote_code=True, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+        if self._tok.pad_token_id is None:
+            self._tok.pad_token = self._tok.eos_token
+
+    def invoke(self, messages, *, max_new_tokens: int = 512, temperature: float = 0.0):
+        roles = {"system": "system", "human": "user", "ai": "assistant"}
+        chat = [{"role": roles.get(m.type, "user"), "content": str(m.content)} for m in messages]
+        with self._lock:
+            if self._model is None:
+                self._load()
+            inputs = self._tok.apply_chat_template(chat, add_generation_prompt=True, return_tensors="pt")
+            sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+            out = self._model.generate(inputs, max_new_tokens=max_new_tokens,
+                                       pad_token_id=self._tok.pad_token_id, **sampling)
+        new_tokens = out[0][inputs.shape[-1]:]
+        usage = {"prompt_tokens": int(inputs.shape[-1]), "completion_tokens": len(new_tokens),
+                 "total_tokens": int(inputs.shape[-1]) + len(new_tokens)}
+        text = self._tok.decode(new_tokens, skip_special_tokens=True).strip()
+        # the remote models run in JSON mode; small local models like to wrap JSON in a code fence
+        fenced = re.fullmatch(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+        return SimpleNamespace(content=fenced.group(1) if fenced else text,
+                               response_metadata={"token_usage": usage, "model_name": self.model_id,
+                                                  "local": True})
+
+
+class ModelRouter:
+    """Chat-model facade with the remote model's interface; attributes not defined here
+    (model_name, temperature, stream ...) are the remote model's."""
+
+    def __init__(self, role: str, remote, local, *, local_kwargs: dict | None = None,
+                 latency_budget_s: float = 10.0, max_error_rate: float = 0.2,
+                 window: int = 50, min_samples: int = 5, probe_every: int = 20):
+        self.role = role
+        self.remote = remote
+        self.local = local
+        self.local_kwargs = local_kwargs or {}
+        self.latency_budget_s = latency_budget_s
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self._samples: deque[tuple[float, bool]] = deque(maxlen=window)   # local (seconds, ok)
+        self._skipped = 0
+        self._disabled = False     # the local model cannot be loaded at all
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.remote, name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        ok = [s for s, good in samples if good]
+        latencies = sorted(s for s, _ in samples)
+        return {"local_calls": len(samples),
+                "local_error_rate": (1 - len(ok) / len(samples)) if samples else 0.0,
+                "local_p95_s": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+                "local_disabled": self._disabled}
+
+    def _local_healthy(self) -> bool:
+        if self._disabled:
+            return False
+        st = self.stats()
+        if st["local_calls"] < self.min_samples:
+            return True
+        if st["local_error_rate"] <= self.max_error_rate and st["local_p95_s"] <= self.latency_budget_s:
+            return True
+        with self._lock:
+            self._skipped += 1
+            probe = self._skipped % self.probe_every == 0
+        return probe
+
+    def invoke(self, messages, *, prefer_local: bool = False, validate=None, remote_slot=None):
+        """`remote_slot` (e.g. a semaphore) is held only around the remote call, so waiting for the
+        single local model does not take capacity from remote calls."""
+        if prefer_local and self._local_healthy():
+            start = time.perf_counter()
+            try:
+                response = self.local.invoke(messages, **self.local_kwargs)
+                ok = validate is None or validate(response.content)
+            except ImportError:
+                self._disabled = True     # transformers/torch not installed: remote only from now on
+                ok = False
+            except Exception:
+                ok = False
+            with self._lock:
+                self._samples.append((time.perf_counter() - start, ok))
+            if ok:
+                metrics.inc("llm_route_total", role=self.role, target="local")
+                return response
+            metrics.inc("llm_route_total", role=self.role, target="remote", reason="local_failed")
+        else:
+            metrics.inc("llm_route_total", role=self.role, target="remote",
+                        reason="unhealthy" if prefer_local else "rule")
+        with remote_slot if remote_slot is not None else nullcontext():
+            return self.remote.invoke(messages)
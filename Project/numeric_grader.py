@@ -0,0 +1,170 @@
+"""Local grader for numeric answers, used before falling back to the LLM judge."""
+from fractions import Fraction
+import math
+import re
+
+REL_TOL = 0.02
+ABS_TOL = 1e-9
+# Integer truths up to this size (counts, years) must be matched exactly; larger ones get REL_TOL.
+EXACT_INT_MAX = 9999
+
+WORD_NUMBERS = {
+    "zero": 0, "none": 0,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100,
+    "thousand": 1000, "million": 1e6, "billion": 1e9,
+    "half": 0.5, "quarter": 0.25,
+}
+
+# Sign words are graded only when the truth is +1/-1 or the question asks for a sign;
+# otherwise "positive" would match almost every numeric ground truth.
+SIGN_WORDS = {"positive": 1, "negative": -1}
+_ASKS_SIGN = re.compile(r"\b(?:sign|positive or negative|negative or positive)\b", re.I)
+
+SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺", "0123456789-+")
+
+_NUM = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)"
+_SCI = re.compile(rf"^({_NUM})\s*(?:e|E)\s*([-+]?\d+)")
+_POW10 = re.compile(rf"^({_NUM})\s*(?:x|\*|×|·)\s*10\s*(?:\^|\*\*)?\s*([-+]?\d+)")
+_BARE_POW10 = re.compile(r"^10\s*(?:\^|\*\*)\s*([-+]?\d+)")
+_MIXED = re.compile(r"^([-+]?\d+)\s+(\d+)\s*/\s*(\d+)")
+_FRACTION = re.compile(rf"^({_NUM})\s*/\s*({_NUM})")
+_PLAIN = re.compile(rf"^({_NUM})")
+
+
+def parse_number(text: str) -> float | None:
+    """Parse a student's numeric answer ("3e8 m/s", "3 x 10^8", "1 1/2", "50%", "twelve").
+
+    Trailing units or words are ignored. Returns None when no number can be read, or when
+    more of a number follows the parsed one ("1 000 000", "five and a half").
+    """
+    parsed = _parse(text)
+    if parsed is None:
+        return None
+    value, percent, _, _ = parsed
+    return value / 100 if percent else value
+
+
+def _parse(text: str) -> tuple[float, bool, bool, bool] | None:
+    """(value, followed by "%", written as a plain integer, nothing else follows) or None;
+    see parse_number."""
+    s = str(text).strip().lower().translate(SUPERSCRIPTS)
+    s = s.replace(",", "").replace("−", "-").replace("≈", "").replace("~", "")
+    s = re.sub(r"^(?:about|approx\.?|approximately|around|roughly|=)\s*", "", s)
+    if not s:
+        return None
+
+    for pattern, build in (
+        (_SCI, lambda m: float(m.group(1)) * 10 ** int(m.group(2))),
+        (_POW10, lambda m: float(m.group(1)) * 10 ** int(m.group(2))),
+        (_BARE_POW10, lambda m: 10.0 ** int(m.group(1))),
+        (_MIXED, lambda m: _mixed(m)),
+        (_FRACTION, lambda m: float(Fraction(m.group(1)) / Fraction(m.group(2)))),
+        (_PLAIN, lambda m: float(m.group(1))),
+    ):
+        m = pattern.match(s)
+        if m:
+            try:
+                value = build(m)
+            except (ZeroDivisionError, ValueError, OverflowError):
+                return None
+            rest = s[m.end():].lstrip()
+            percent = rest.startswith("%")
+            if percent:
+                rest = rest[1:]
+            if _continues_number(rest) or not math.isfinite(value):
+                return None
+            integer = pattern is _PLAIN and "." not in m.group(1)
+            return value, percent, integer, not rest.strip(" .")
+
+    value = _parse_words(s)
+    if value is None:
+        return None
+    bare = all(w in WORD_NUMBERS or w in ("and", "minus", "negative") for w in re.findall(r"[^\s-]+", s.strip(" .")))
+    return value, False, float(value).is_integer(), bare
+
+
+def _continues_number(rest: str) -> bool:
+    """True if the text after a parsed number is more number ("000", "and a half", "million")."""
+    return bool(re.match(r"\d", rest)) or any(w in WORD_NUMBERS for w in re.findall(r"[a-z]+", rest))
+
+
+def _mixed(m: re.Match) -> float:
+    whole, num, den = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    frac = Fraction(num, den)
+    return float(whole - frac if whole < 0 else whole + frac)
+
+
+def _parse_words(s: str) -> float | None:
+    """Small number-words parser: "twenty one", "minus three", "two hundred"."""
+    words = re.findall(r"[a-z]+", s)
+    if not words:
+        return None
+    sign = 1
+    if words[0] in ("minus", "negative") and len(words) > 1:
+        sign, words = -1, words[1:]
+    total, current, matched = 0.0, 0.0, False
+    for j, w in enumerate(words):
+        if w == "and":
+            continue
+        if w not in WORD_NUMBERS:
+            if any(later in WORD_NUMBERS for later in words[j + 1:]):
+                return None     # "five and a half": the rest of the number was not understood
+            break
+        matched = True
+        v = WORD_NUMBERS[w]
+        if w in ("hundred",):
+            current = (current or 1) * v
+        elif w in ("thousand", "million", "billion"):
+            total += (current or 1) * v
+            current = 0.0
+        elif w in ("half", "quarter"):
+            current = (current or 1) * v
+        else:
+            current += v
+    return sign * (total + current) if matched else None
+
+
+def grade_numeric(student_answer: str, ground_truth: str, question: str = "",
+                  rel_tol: float = REL_TOL, abs_tol: float = ABS_TOL) -> tuple[int, str] | None:
+    """Deterministically grade a numeric answer.
+
+    Only bare numbers (optionally followed by "%") are graded here: units, expressions and
+    other text ("12 inches", "2 x 10") go to the judge. A small plain integer truth ("1969",
+    "206", up to EXACT_INT_MAX) must be matched exactly; other truths within `rel_tol`.
+    Returns (score, rationale), or None if the LLM judge should decide.
+    """
+    parsed_truth = _parse(ground_truth)
+    if parsed_truth is None or not parsed_truth[3]:
+        return None
+    truth, truth_percent, truth_integer, _ = parsed_truth
+    if truth_percent:
+        truth /= 100
+
+    answer = str(student_answer).strip()
+    if not answer:
+        return 0, "Blank response."
+
+    sign = SIGN_WORDS.get(answer.lower().strip(" ."))
+    if sign is not None:
+        if abs(truth) != 1 and not _ASKS_SIGN.search(question):
+            return None
+        if truth != 0 and math.copysign(1, truth) == sign:
+            return 10, f"Correct sign ({answer}); expected {ground_truth}."
+        return 0, f"Incorrect sign ({answer}); expected {ground_truth}."
+
+    parsed = _parse(answer)
+    if parsed is None or not parsed[3]:
+        return None
+    value, percent, _, _ = parsed
+    # truths are bare numbers, so "50%" may answer either "50" or "0.5"
+    candidates = (value, value / 100) if percent else (value,)
+    if truth_integer and not truth_percent and abs(truth) <= EXACT_INT_MAX:
+        rel_tol = 0.0
+    for v in candidates:
+        if math.isclose(v, truth, rel_tol=rel_tol, abs_tol=abs_tol):
+            return 10, f"{answer} matches the expected value {ground_truth}."
+    return 0, f"{answer} does not match the expected value {ground_truth}."
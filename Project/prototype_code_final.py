@@ -1,36 +1,35 @@
 from typing import Annotated, Sequence, TypedDict, Literal
 from dotenv import load_dotenv
-from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, HumanMessage, RemoveMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
+from langgraph.types import Command, interrupt
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langchain_core.runnables import RunnableConfig
 from typing_extensions import NotRequired
+from concurrent.futures import Future, ThreadPoolExecutor
+from numeric_grader import grade_numeric
+from judge_cache import JudgeCache
+from question_bank import QuestionBank, subject_key
+from response_log import ResponseLog
+from model_router import LocalChatModel, ModelRouter
+from seen_index import SeenIndex, question_hash, remember, merge_seen
+from reducers import sum_counts, append
+from stream_items import ItemStreamParser
+from incremental_saver import IncrementalSqliteSaver
+import instrumentation as metrics
+import ability as irt
+import atexit
 import re
 import json
+import threading
+import time
 import uuid
 
 load_dotenv()
 
-def sum_counts(existing: int | None, new: int | None) -> int:
-    ex = existing if existing else 0
-    nw = new if new else 0
-    return ex + nw
-
-def extend_dict_list(existing: list[dict] | None, new: list[dict] | None) -> list[dict]:
-    ex = existing if existing else []
-    nw = new if new else []
-    return ex + nw
-
-def extend_int_list(existing: list[int] | None, new: list[int] | None) -> list[int]:
-    ex = existing if existing else []
-    nw = new if new else []
-    return ex + nw
-
-def extend_str_list(existing: list[str] | None, new: list[str] | None) -> list[str]:
-    ex = existing if existing else []
-    nw = new if new else []
-    return ex + nw
-
 Level = Literal[
     "Elementary School Level",
     "Middle School Level",
@@ -61,8 +60,74 @@ LEVEL_DESC: dict[Level, str] = {
     "Advanced Graduate Level": "Research-style twists; novel combinations; concise formal arguments.",
 }
 
-PROMOTE_THRESHOLD = 8.5
-DEMOTE_THRESHOLD  = 6.5
+# Levels follow an IRT ability estimate updated after every graded answer (ability.py).
+# While it is still uncertain, a batch ends early once the learner is clearly at another level.
+EARLY_BATCH_EXIT = True
+
+# Generate the next batch in the background, at the level the ability estimate predicts,
+# while the learner is answering the current one. A prefetch still queued when the batch
+# is needed is cancelled and generated live instead.
+PREFETCH = False
+
+# Grade the whole batch with a single judge call once the last answer is in,
+# instead of one judge call per question.
+BATCH_GRADING = False
+
+# Hand each answer to a background grading pool so the learner can move on to
+# the next question immediately; grades are collected before the batch summary.
+# GRADING_WORKERS caps the number of judge requests in flight.
+CONCURRENT_GRADING = False
+GRADING_WORKERS = 4
+
+# The judge runs at temperature 0, so identical (question, truth, answer) triples
+# are served from this SQLite cache. Set to None to disable.
+JUDGE_CACHE_PATH = "judge_cache.sqlite3"
+JUDGE_CACHE_MAX_ENTRIES = 100_000
+
+# Serve batches from a persistent per-(subject, level) question bank when it has
+# enough unseen items; a background worker tops a pool up when a learner runs low.
+# Set to None to always generate live.
+QUESTION_BANK_PATH = "question_bank.sqlite3"
+QUESTION_BANK_LOW_WATERMARK = 10
+
+# Every graded answer is appended to this columnar log (see response_log.py and
+# cohort_analytics.py). Set to None to disable.
+RESPONSE_LOG_PATH = "response_log"
+BATCH_SIZE = 5
+
+# Generated questions that repeat or paraphrase the learner's history are dropped
+# locally; ask the generator again (up to this many calls) to fill the batch.
+GENERATION_ATTEMPTS = 2
+
+# Stream live generations and show question 1 as soon as its JSON object is complete,
+# while the rest of the batch is still being generated.
+STREAM_GENERATION = False
+
+# Sessions are driven through start_session()/reply(): nodes that need learner input
+# pause the graph with interrupt(), and only the checkpoint is kept between turns.
+# A path stores them in SQLite (only the channels each step changed, see incremental_saver.py),
+# so a session survives a crash and can be resumed by learner id; None keeps them in memory.
+SESSION_CHECKPOINT_PATH: str | None = "sessions.sqlite3"
+
+# No node reads `messages`; it is only a transcript, carried in every checkpoint. Retention:
+# "all" keeps every message, "last_n" the newest MESSAGE_HISTORY_LIMIT, "none" nothing.
+# With MESSAGE_LOG_PATH set, every message is also appended to that file (spill).
+MESSAGE_RETENTION: Literal["all", "last_n", "none"] = "last_n"
+MESSAGE_HISTORY_LIMIT = 20
+MESSAGE_LOG_PATH: str | None = None
+
+# Send cheap calls to the local Qwen model (model_router.py) while it keeps within its
+# latency/error budget: generation at LOCAL_GENERATION_LEVELS, and grading when both the
+# ground truth and the answer are short text. False sends everything to gpt-4o-mini.
+LOCAL_MODEL_ROUTING = False
+LOCAL_GENERATION_LEVELS: tuple[Level, ...] = ("Elementary School Level", "Middle School Level")
+LOCAL_JUDGE_MAX_WORDS = 4
+
+# Upper bound on generator/judge requests in flight across all sessions in this process.
+MAX_CONCURRENT_LLM_CALLS = 16
+
+# LangChain callback handlers attached to every session run (e.g. by load_test.py).
+SESSION_CALLBACKS: list = []
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -72,12 +137,14 @@ class AgentState(TypedDict):
     #batch content/flow
     batch: NotRequired[list[dict]]
     cursor: NotRequired[int]
-    responses: Annotated[list[dict], extend_dict_list]
+    responses: Annotated[Sequence[dict], append]
+    answered: NotRequired[bool]     # the last get_answers step recorded a reply for batch[cursor-1]
     batch_avg: NotRequired[float]
     #adaptivity
     level: NotRequired[Level]
-    seen_questions: Annotated[list[str], extend_str_list]
-    batch_scores: Annotated[list[int], extend_int_list]
+    ability: NotRequired[dict]      # ability.py estimate: prior centre + credit/answers per level
+    seen_questions: Annotated[set[int], merge_seen]   # 64-bit question hashes (seen_index.py)
+    batch_scores: Annotated[Sequence[dict], append]   # {"q_id", "score"} per graded answer
     continue_flag: NotRequired[bool]
 
 class QAItem(TypedDict):
@@ -86,6 +153,7 @@ class QAItem(TypedDict):
     explanation: NotRequired[str]
     answer: str
     answer_type: Literal["text", "numeric"]
+    local: NotRequired[bool]    # generated by the local model: never stored in the shared question bank
 
 generator_llm = ChatOpenAI(
     model = "gpt-4o-mini", 
@@ -97,17 +165,74 @@ judge_llm = ChatOpenAI(
     temperature = 0.0, 
     model_kwargs={"response_format": {"type": "json_object"}})
 
-def intake(state: AgentState) -> AgentState:
+if LOCAL_MODEL_ROUTING:
+    _local_llm = LocalChatModel()
+    generator_llm = ModelRouter("generator", generator_llm, _local_llm, latency_budget_s=30.0,
+                                local_kwargs={"max_new_tokens": 1024, "temperature": 0.9})
+    judge_llm = ModelRouter("judge", judge_llm, _local_llm, latency_budget_s=5.0,
+                            local_kwargs={"max_new_tokens": 160})
+
+_llm_slots = threading.BoundedSemaphore(MAX_CONCURRENT_LLM_CALLS)
+
+def set_llm_concurrency(limit: int) -> None:
+    global _llm_slots, _prefetch_pool
+    _llm_slots = threading.BoundedSemaphore(limit)
+    _prefetch_pool = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="prefetch")
+
+def _llm_invoke(llm: ChatOpenAI, messages: list[BaseMessage], role: str, **route) -> str:
+    """Call a shared LLM client, waiting for a free slot if MAX_CONCURRENT_LLM_CALLS remote calls
+    are in flight. `route` (prefer_local, validate) is passed on when the client is a ModelRouter,
+    which takes the slot only if the call goes remote."""
+    start = time.perf_counter()
+    if isinstance(llm, ModelRouter):
+        response = llm.invoke(messages, remote_slot=_llm_slots, **route)
+    else:
+        with _llm_slots:
+            start = time.perf_counter()
+            response = llm.invoke(messages)
+    metrics.record_llm_call(role, time.perf_counter() - start, response)
+    meta = getattr(response, "response_metadata", None) or {}
+    usage = meta.get("token_usage") or {}
+    _thread_usage.tokens = getattr(_thread_usage, "tokens", 0) + usage.get("total_tokens", 0)
+    _thread_usage.local = bool(meta.get("local"))
+    return response.content
+
+# LLM tokens spent by the current thread, so a grade can be logged with its cost, and whether
+# its last call was answered by the local model
+_thread_usage = threading.local()
+
+def _metered(fn, *args):
+    """Run fn(*args) on this thread; returns (result, wall time in ms, LLM tokens it spent)."""
+    _thread_usage.tokens = 0
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000, _thread_usage.tokens
+
+judge_cache = JudgeCache(JUDGE_CACHE_PATH, JUDGE_CACHE_MAX_ENTRIES) if JUDGE_CACHE_PATH else None
+
+response_log = ResponseLog(RESPONSE_LOG_PATH) if RESPONSE_LOG_PATH else None
+if response_log is not None:
+    atexit.register(response_log.close)
+
+# ---------- Session I/O ----------
+# Text produced by nodes is buffered per session and handed back by start_session()/reply().
+_outbox: dict[str, list[str]] = {}
+
+def _session(config: RunnableConfig) -> str:
+    return str(config["configurable"]["thread_id"])
+
+def _say(config: RunnableConfig, *lines: str) -> None:
+    _outbox.setdefault(_session(config), []).extend(lines)
+
+def intake(state: AgentState, config: RunnableConfig) -> AgentState:
     subject = state.get("subject")
     if not subject:
-        subject = input("\nWhat do you want to learn about today? ")
+        subject = str(interrupt("What do you want to learn about today?")).strip()
     
     level = state.get("level")
     if not level:
-        print("\nChoose a starting level:")
-        for i, name in enumerate(LEVELS, 1):
-            print(f"{i}. {name}")
-        choice = input("Enter 1-7 (default 3 for High School Level): ").strip()
+        menu = "\n".join(f"{i}. {name}" for i, name in enumerate(LEVELS, 1))
+        choice = str(interrupt(f"Choose a starting level:\n{menu}\nEnter 1-7 (default 3 for High School Level):")).strip()
 
         try:
             idx = int(choice)-1
@@ -117,18 +242,15 @@ def intake(state: AgentState) -> AgentState:
                 level = "High School Level"
         except Exception:
             level = "High School Level"
-        print(f"Starting at: {level}")
-    return {"subject": subject, "level": level}
+        _say(config, f"Starting at: {level}")
+    update: AgentState = {"subject": subject, "level": level}
+    if "ability" not in state:
+        update["ability"] = irt.prior(LEVELS.index(level), len(LEVELS))
+    return update
 
 
-def generate_batch_questions(state: AgentState) -> AgentState:
-    """Generate a batch of questions"""
-    subject = state.get("subject")
-    level: Level = state.get("level", "High School Level")
-    avoid_list = state.get("seen_questions", [])[-12:]
-    avoid_text = "\n-" + "\n-".join(avoid_list) if avoid_list else " (none)"
-    
-    system_prompt = SystemMessage(
+def _generation_prompt(subject: str, level: Level) -> SystemMessage:
+    return SystemMessage(
         content=(
             f"You are a teaching assistant for {subject}.\n"
             f"Target **{level}**.\n"
@@ -136,8 +258,7 @@ def generate_batch_questions(state: AgentState) -> AgentState:
             "Generate 5 distinct short subject-matter questions AND their correct final answers.\n"
             "Provide a brief explanation (1–3 sentences) that supports the final answer.\n"
             "No meta-questions or follow-ups. Do NOT include the solution value inside `question`.\n"
-            "Avoid repeating or paraphrasing ANY of these recent questions:\n"
-            f"{avoid_text}\n\n"
+            "Vary the subtopics; avoid the most common textbook questions.\n\n"
             "For numeric answers, `answer` must be a bare number string (no units/words).\n"
             "Return ONLY valid JSON in exactly this structure:\n"
             '{"items":[\n'
@@ -148,9 +269,39 @@ def generate_batch_questions(state: AgentState) -> AgentState:
             '  {"question":"...", "explanation":"...", "answer":"...", "answer_type":"text|numeric"}\n'
             ']}'
         ))
-    ai = generator_llm.invoke([system_prompt])
-    raw = ai.content
 
+def _generate_batch(subject: str, level: Level, seen: set[int], allow_local: bool = True) -> list[QAItem]:
+    """Call the generator LLM and return the validated items that are not repeats or
+    paraphrases of `seen` (may be empty). Items answered by the local model are marked `local`."""
+    system_prompt = _generation_prompt(subject, level)
+    batch: list[QAItem] = []
+    index = SeenIndex(seen, _question_texts)
+    for attempt in range(GENERATION_ATTEMPTS):
+        if attempt:
+            metrics.inc("generation_retries_total")
+        raw = _llm_invoke(generator_llm, [system_prompt], "generator",
+                          prefer_local=allow_local and level in LOCAL_GENERATION_LEVELS, validate=_json_with("items"))
+        items = _parse_items(raw, index, BATCH_SIZE - len(batch))
+        if getattr(_thread_usage, "local", False):
+            for it in items:
+                it["local"] = True
+        batch += items
+        if len(batch) == BATCH_SIZE:
+            break
+    return batch
+
+def _json_with(key: str):
+    """Validator for routed calls: the reply is a JSON object containing `key`."""
+    def valid(raw: str) -> bool:
+        try:
+            obj = json.loads(raw)
+        except (ValueError, TypeError):
+            return False
+        return isinstance(obj, dict) and key in obj
+    return valid
+
+def _parse_items(raw: str, index: SeenIndex, limit: int) -> list[QAItem]:
+    """Validate generator JSON into QAItems, skipping anything already in `index` (which is updated)."""
     try:
         data = json.loads(raw)
         items = data.get("items", [])
@@ -158,40 +309,188 @@ def generate_batch_questions(state: AgentState) -> AgentState:
         items = []
 
     batch: list[QAItem] = []
-    seen = set(state.get("seen_questions", []))
 
     for item in items:
-        question = str(item.get("question","")).strip()
-        explanation = str(item.get("explanation", "")).strip()
-        answer = str(item.get("answer", "")).strip()
-        answer_type = (item.get("answer_type") or "text").strip().lower()
-
-        if not question or not answer:
-            continue
-        if answer_type not in ("text", "numeric"):
-            try:
-                float(answer)
-                answer_type = "numeric"
-            except Exception:
-                answer_type = "text"
-
-        if question in seen:
+        qa = _validate_item(item, index)
+        if qa is None:
             continue
+        batch.append(qa)
+        if len(batch) == limit:
+            break
 
-        unique_id = str(uuid.uuid4())
+    return batch
 
-        batch.append({
-            "q_id": unique_id,
-            "question":question,
-            "explanation": explanation if explanation else "",
-            "answer": answer,
-            "answer_type": answer_type
-        })
+def _validate_item(item: dict, index: SeenIndex) -> QAItem | None:
+    """One generated item as a QAItem, or None if it is incomplete or already in `index` (which is updated)."""
+    question = str(item.get("question","")).strip()
+    explanation = str(item.get("explanation", "")).strip()
+    answer = str(item.get("answer", "")).strip()
+    answer_type = (item.get("answer_type") or "text").strip().lower()
 
-        seen.add(question)
+    if not question or not answer:
+        return None
+    if answer_type not in ("text", "numeric"):
+        try:
+            float(answer)
+            answer_type = "numeric"
+        except Exception:
+            answer_type = "text"
 
-        if len(batch) == 5:
-            break
+    if question in index:
+        return None
+    index.add(question)
+
+    unique_id = str(uuid.uuid4())
+
+    return {
+        "q_id": unique_id,
+        "question":question,
+        "explanation": explanation if explanation else "",
+        "answer": answer,
+        "answer_type": answer_type
+    }
+
+question_bank = QuestionBank(
+    QUESTION_BANK_PATH,
+    # refills run in the background, so they can wait for the remote model and be shared
+    generate_fn=lambda subject, level: _generate_batch(subject, level, set(), allow_local=False),
+    low_watermark=QUESTION_BANK_LOW_WATERMARK) if QUESTION_BANK_PATH else None
+
+def _question_texts(hashes: list[int]) -> dict[int, str]:
+    """Question text for seen hashes whose fingerprints are not cached in this process."""
+    return question_bank.questions_by_hash(hashes) if question_bank is not None else {}
+
+# ---------- Prefetch ----------
+# _prefetched, _streams and _pending_grades are keyed by session and touched by nodes of
+# different sessions on executor threads (ta_server.py): always access them under this lock.
+_registry_lock = threading.Lock()
+# one worker per LLM slot: a deeper queue only delays prefetches past the point they are needed
+_prefetch_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_LLM_CALLS, thread_name_prefix="prefetch")
+_prefetched: dict[tuple[str, Level], Future] = {}
+
+def _start_prefetch(session: str, subject: str, level: Level, seen: set[int]) -> None:
+    """Generate the next batch at `level` (the level decide_next_level is expected to pick)."""
+    if question_bank is not None and question_bank.available(
+            subject, level, BATCH_SIZE, seen, SeenIndex(seen, _question_texts).__contains__):
+        return    # the bank can already serve this level
+    with _registry_lock:
+        if (session, level) not in _prefetched:
+            _prefetched[(session, level)] = _prefetch_pool.submit(_generate_batch, subject, level, set(seen))
+
+def _cancel_prefetch(session: str, subject: str, keep: Level | None = None) -> None:
+    """Drop the session's prefetched batches for every level except `keep`; queued ones are
+    cancelled, finished ones are saved to the question bank."""
+    with _registry_lock:
+        dropped = {k[1]: _prefetched.pop(k) for k in [k for k in _prefetched if k[0] == session and k[1] != keep]}
+    for lvl, fut in dropped.items():
+        if not fut.cancel() and question_bank is not None:
+            fut.add_done_callback(lambda f, lvl=lvl: _save_to_bank(subject, lvl, f))
+
+def _save_to_bank(subject: str, level: Level, fut: Future) -> None:
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    question_bank.add(subject, level, fut.result())
+
+def _take_prefetched(session: str, level: Level, index: SeenIndex) -> list[QAItem]:
+    """Return the prefetched batch for `level` (waiting if it is already running), minus anything
+    seen since; [] if there is none or it never started, so the caller generates live instead."""
+    with _registry_lock:
+        fut = _prefetched.pop((session, level), None)
+    if fut is None or fut.cancel() or fut.cancelled():
+        return []
+    try:
+        batch = fut.result()
+    except Exception:
+        return []
+    return [it for it in batch if it["question"] not in index]
+
+# ---------- Streaming generation ----------
+class _BatchStream:
+    """Items of one streamed batch, appended by a background thread as they are parsed."""
+
+    def __init__(self):
+        self.items: list[QAItem] = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    def push(self, item: QAItem) -> None:
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def finish(self) -> None:
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def item(self, i: int) -> QAItem | None:
+        """The i-th item, waiting for it if generation is still running; None once the stream ended short."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.items) > i or self.done)
+            return self.items[i] if i < len(self.items) else None
+
+_streams: dict[str, _BatchStream] = {}
+_stream_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stream")
+
+def _stream_batch(stream: _BatchStream, subject: str, level: Level, seen: set[int]) -> None:
+    index = SeenIndex(seen, _question_texts)
+    parser = ItemStreamParser()
+    try:
+        with _llm_slots:
+            start = time.perf_counter()
+            response = None     # chunks summed into one message, so the final usage chunk is kept
+            for chunk in generator_llm.stream([_generation_prompt(subject, level)], stream_usage=True):
+                response = chunk if response is None else response + chunk
+                for raw in parser.feed(str(chunk.content)):
+                    item = _validate_item(raw, index)
+                    if item is not None and len(stream.items) < BATCH_SIZE:
+                        if not stream.items:
+                            metrics.observe("first_item_seconds", time.perf_counter() - start)
+                        stream.push(item)
+            metrics.record_llm_call("generator_stream", time.perf_counter() - start, response)
+    finally:
+        stream.finish()
+    if question_bank is not None:
+        question_bank.add(subject, level, stream.items)
+
+def _stream_item(config: RunnableConfig, i: int) -> QAItem | None:
+    """The i-th item of the session's in-flight streamed batch, if there is one."""
+    with _registry_lock:
+        stream = _streams.get(_session(config))
+    return stream.item(i) if stream is not None else None
+
+def _seen_entry(items: list[QAItem]) -> set[int]:
+    for it in items:
+        remember(it["question"])     # fingerprints stay in the process cache, not in the checkpoint
+    return {question_hash(it["question"]) for it in items}
+
+def generate_batch_questions(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Generate a batch of questions"""
+    session = _session(config)
+    subject = state.get("subject")
+    level: Level = state.get("level", "High School Level")
+    seen = set(state.get("seen_questions") or ())
+    index = SeenIndex(seen, _question_texts)
+
+    batch = _take_prefetched(session, level, index) if PREFETCH else []
+    _cancel_prefetch(session, subject)
+    if batch and question_bank is not None:
+        question_bank.add(subject, level, batch)
+    if not batch and question_bank is not None:
+        batch = question_bank.take(subject, level, BATCH_SIZE, seen, index.__contains__)
+        if len(batch) < BATCH_SIZE:
+            batch = []
+    if not batch and STREAM_GENERATION:
+        stream = _BatchStream()
+        with _registry_lock:
+            _streams[session] = stream
+        _stream_pool.submit(_stream_batch, stream, subject, level, set(seen))
+        first = stream.item(0)
+        batch = [first] if first is not None else []
+    if not batch:
+        batch = _generate_batch(subject, level, seen)
+        if question_bank is not None:
+            question_bank.add(subject, level, batch)
 
     if not batch:
         q = f"Name one key concept in {subject}."
@@ -203,73 +502,118 @@ def generate_batch_questions(state: AgentState) -> AgentState:
             "answer": "Answers vary",
             "answer_type": "text"
         }]
-        seen.add(q)
+
+    new_seen = _seen_entry(batch)
+    seen.update(new_seen)
+
+    if PREFETCH:
+        est = state.get("ability") or irt.prior(LEVELS.index(level), len(LEVELS))
+        _start_prefetch(session, subject, LEVELS[irt.level_index(est)], seen)
 
     return {"batch": batch, 
             "cursor": 0, 
             "responses": [],
             "batch_scores": [],
-            "seen_questions": list(seen)}
+            "seen_questions": new_seen}
 
-def get_answer(state: AgentState) -> AgentState:
+def get_answer(state: AgentState, config: RunnableConfig) -> AgentState:
     """Show the questions and collect answers from the user and advance cursor."""
     batch = state.get("batch") or []
     cursor = state.get("cursor", 0)
 
     if cursor >= len(batch):
-        print("\nAll questions in this batch have been answered.")
-        return {}
-    
+        # A streamed batch grows as items arrive. The item is checkpointed before it is asked
+        # (more_questions loops back here), so a reply to it survives losing the stream.
+        item = _stream_item(config, cursor)
+        if item is None:
+            _say(config, "All questions in this batch have been answered.")
+            return {"answered": False}
+        return {"batch": list(batch) + [item], "seen_questions": _seen_entry([item]), "answered": False}
+
+    with _registry_lock:
+        streaming = _session(config) in _streams
+    total = max(len(batch), BATCH_SIZE) if streaming else len(batch)
     item  = batch[cursor]
-    print(f"\nQ {cursor+1}/{len(batch)}: {item['question']}")
-    user_answer = input("Your answer: ").strip()
+    user_answer = str(interrupt(f"Q {cursor+1}/{total}: {item['question']}\nYour answer:")).strip()
 
     hm = HumanMessage(content=user_answer)
 
-    return {"messages": [hm],
+    return {"messages": _retain_messages(state, config, [hm]),
             "responses": [{"q_id": item["q_id"], "answer": user_answer}],
+            "answered": True,
             "cursor": cursor + 1,
             "question_count": 1
             }
 
-def evaluate_answer(state: AgentState) -> AgentState:
-    """Grade the hust submitted answer (cursor-1) using LLM as a semantic judge.
-       Returns score (0-10) and prints a short rationale."""
-    
-    batch = state.get("batch") or []
-    cursor = state.get("cursor", 0)
-    index = cursor - 1
-
-    if index < 0 or index >= len(batch):
-        return {}
-    
-    item = batch[index]
-    qid = item["q_id"]
+_message_log_lock = threading.Lock()
+
+def _retain_messages(state: AgentState, config: RunnableConfig, new: list[BaseMessage]) -> list[BaseMessage]:
+    """The `messages` update for `new` under MESSAGE_RETENTION: spill to the log, then drop the
+    oldest messages (RemoveMessage) so the channel stays within its limit."""
+    if MESSAGE_LOG_PATH:
+        with _message_log_lock, open(MESSAGE_LOG_PATH, "a", encoding="utf-8") as f:
+            for m in new:
+                f.write(f"[{_session(config)}] {'You' if isinstance(m, HumanMessage) else 'AI'}: {m.content}\n")
+    if MESSAGE_RETENTION == "all":
+        return new
+    existing = state.get("messages") or []
+    keep = MESSAGE_HISTORY_LIMIT if MESSAGE_RETENTION == "last_n" else 0
+    n_new = min(len(new), keep)
+    n_old = max(0, keep - n_new)
+    expired = existing[:max(0, len(existing) - n_old)]
+    return [RemoveMessage(id=m.id) for m in expired if m.id] + new[len(new) - n_new:]
+
+JUDGE_SYSTEM_PROMPT = (
+    "You are a fair grader focussed more on the conceptual understanding of the student.\n"
+    "Judge the student's answer against the ground truth answer.\n"
+    "Consider synonyms, paraphrases, and numeric/text equivalence (e.g., '+1' vs 'positive').\n"
+    "Give a score between 0 to 10, with 0 for a blank response and 10 for a perfect response.\n"
+    "Also provide a rationale for the score you assign to a particular answer.\n"
+)
+
+def _judge_payload(item: QAItem, user_answer: str) -> dict:
+    return {
+        "question": item["question"],
+        "ground_truth_answer": item["answer"],
+        "answer_type": item["answer_type"],
+        "model_explanation": item.get("explanation", ""),
+        "student_answer": user_answer
+    }
 
-    user_answer = ""
+def _user_answer(state: AgentState, qid: str) -> str:
     for user_response in reversed(state.get("responses", [])):
         if user_response.get("q_id") == qid:
-            user_answer = str(user_response.get("answer", "")).strip()
-            break
+            return str(user_response.get("answer", "")).strip()
+    return ""
+
+def _grade_local(item: QAItem, user_answer: str) -> tuple[int, str] | None:
+    """Grade numeric items without a network call; None means the LLM judge must decide."""
+    if item["answer_type"] != "numeric":
+        return None
+    result = grade_numeric(user_answer, item["answer"], item["question"])
+    metrics.inc("numeric_grades_total", outcome="local" if result is not None else "unparsed")
+    return result
+
+def _grade_one(item: QAItem, user_answer: str) -> tuple[int, str]:
+    """Grade a single answer with the LLM judge. Returns (score 0-10, rationale)."""
+    local = _grade_local(item, user_answer)
+    if local is not None:
+        return local
+    cached = _cached_grade(item, user_answer)
+    if cached is not None:
+        return cached
 
     system_prompt = SystemMessage(content=(
-        "You are a fair grader focussed more on the conceptual understanding of the student.\n"
-        "Judge the student's answer against the ground truth answer.\n"
-        "Consider synonyms, paraphrases, and numeric/text equivalence (e.g., '+1' vs 'positive').\n"
-        "Give a score between 0 to 10, with 0 for a blank response and 10 for a perfect response.\n"
-        "Also provide a rationale for the score you assign to a particular answer.\n"
+        JUDGE_SYSTEM_PROMPT +
         'Return ONLY JSON: {"score": <int 0..10>, "explanation": "<short rationale>"}'
     ))
+    payload = _judge_payload(item, user_answer)
 
-    payload = {
-        "question": item["question"],
-        "ground_truth_answer": item["answer"],
-        "answer_type": item["answer_type"],
-        "model_explanation": item.get("explanation", ""),
-        "student_answer": user_answer
-    }
-
-    judge_raw = judge_llm.invoke([system_prompt, HumanMessage(content=json.dumps(payload, ensure_ascii=False))]).content
+    short = (item.get("answer_type") == "text"
+             and len(item["answer"].split()) <= LOCAL_JUDGE_MAX_WORDS
+             and 0 < len(user_answer.split()) <= LOCAL_JUDGE_MAX_WORDS)
+    judge_raw = _llm_invoke(judge_llm, [system_prompt, HumanMessage(content=json.dumps(payload, ensure_ascii=False))], "judge",
+                            prefer_local=short, validate=_json_with("score"))
 
     try:
         obj = json.loads(judge_raw)
@@ -281,78 +625,249 @@ def evaluate_answer(state: AgentState) -> AgentState:
         reason = judge_raw.strip()                       # keep the whole raw text as the rationale
 
     score = max(0, min(10, score))
-    print(f"Score: {score}/10")
+    if not getattr(_thread_usage, "local", False):
+        # a local grade is only checked for shape; do not serve it to every learner from the cache
+        _store_grade(item, user_answer, score, reason)
+    return score, reason
+
+def _cached_grade(item: QAItem, user_answer: str) -> tuple[int, str] | None:
+    if judge_cache is None:
+        return None
+    cached = judge_cache.get(item["question"], item["answer"], user_answer, item["answer_type"])
+    metrics.inc("judge_cache_lookups_total", result="hit" if cached is not None else "miss")
+    return cached
+
+def _store_grade(item: QAItem, user_answer: str, score: int, reason: str) -> None:
+    if judge_cache is not None:
+        judge_cache.put(item["question"], item["answer"], user_answer, score, reason, item["answer_type"])
+
+def _grade_batch(items: list[QAItem], answers: list[str]) -> list[tuple[int, str]]:
+    """Grade all answers with one judge call; items missing or malformed in the reply are re-graded one by one."""
+    system_prompt = SystemMessage(content=(
+        JUDGE_SYSTEM_PROMPT +
+        "Grade EVERY item independently and echo its q_id.\n"
+        'Return ONLY JSON: {"grades": [{"q_id": "<q_id>", "score": <int 0..10>, "explanation": "<short rationale>"}, ...]}'
+    ))
+    graded: dict[str, tuple[int, str]] = {}
+    for item, ans in zip(items, answers):
+        known = _grade_local(item, ans)
+        if known is None:
+            known = _cached_grade(item, ans)
+        if known is not None:
+            graded[item["q_id"]] = known
+
+    payload = [{"q_id": item["q_id"], **_judge_payload(item, ans)}
+               for item, ans in zip(items, answers) if item["q_id"] not in graded]
+
+    grades = []
+    if payload:
+        judge_raw = _llm_invoke(judge_llm, [system_prompt, HumanMessage(content=json.dumps({"items": payload}, ensure_ascii=False))], "judge_batch")
+        try:
+            grades = json.loads(judge_raw).get("grades", [])
+        except Exception:
+            grades = []
+    answers_by_id = {item["q_id"]: (item, ans) for item, ans in zip(items, answers)}
+    for g in grades if isinstance(grades, list) else []:
+        try:
+            qid = str(g["q_id"])
+            score, reason = max(0, min(10, int(g["score"]))), str(g.get("explanation", "")).strip()
+        except Exception:
+            continue
+        if qid in answers_by_id and qid not in graded:
+            graded[qid] = (score, reason)
+            _store_grade(*answers_by_id[qid], score, reason)
+
+    results = []
+    for item, ans in zip(items, answers):
+        if item["q_id"] not in graded:
+            metrics.inc("judge_regrades_total")
+            graded[item["q_id"]] = _grade_one(item, ans)
+        results.append(graded[item["q_id"]])
+    return results
+
+_grading_pool = ThreadPoolExecutor(max_workers=GRADING_WORKERS, thread_name_prefix="grader")
+_pending_grades: dict[tuple[str, str], Future] = {}
+
+def _collect_grades(state: AgentState, config: RunnableConfig, batch: list[QAItem],
+                    graded: dict[str, int]) -> dict[str, int]:
+    """Scores of the answered items of `batch` that are not in `graded`, reported in question order:
+    the session's background grade if there is one, otherwise graded now (the future is gone
+    after a restart or release_session)."""
+    session = _session(config)
+    answered = {r.get("q_id") for r in state.get("responses", [])}
+    scores = {}
+    for i, item in enumerate(batch, 1):
+        qid = item["q_id"]
+        if qid in graded or qid not in answered:
+            continue
+        with _registry_lock:
+            fut = _pending_grades.pop((session, qid), None)
+        if fut is not None:
+            (score, reason), ms, tokens = fut.result()
+        else:
+            (score, reason), ms, tokens = _metered(_grade_one, item, _user_answer(state, qid))
+        _log_grades(state, config, [item], [score], ms, tokens)
+        _say(config, f"Q {i}/{len(batch)}")
+        _say_grade(config, score, reason)
+        scores[qid] = score
+    return scores
+
+def _score_records(items: list[QAItem], scores: list[int]) -> list[dict]:
+    return [{"q_id": item["q_id"], "score": score} for item, score in zip(items, scores)]
+
+def _say_grade(config: RunnableConfig, score: int, reason: str) -> None:
+    _say(config, f"Score: {score}/10")
     if reason:
-        print("Reason:", reason)
+        _say(config, f"Reason: {reason}")
 
-    return {"score": score, "batch_scores": [score]}
+def evaluate_answer(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Grade the hust submitted answer (cursor-1) using LLM as a semantic judge.
+       Returns score (0-10) and prints a short rationale.
+       With BATCH_GRADING, waits for the last answer and grades the whole batch at once."""
+    
+    batch = state.get("batch") or []
+    cursor = state.get("cursor", 0)
+    index = cursor - 1
+
+    if index < 0 or index >= len(batch) or not state.get("answered", True):
+        return {}   # get_answers only fetched a streamed item (or the stream ended): nothing new to grade
+
+    if BATCH_GRADING:
+        if cursor < len(batch) or _stream_item(config, cursor) is not None:
+            return {}
+        answers = [_user_answer(state, item["q_id"]) for item in batch]
+        results, ms, tokens = _metered(_grade_batch, batch, answers)
+        _log_grades(state, config, batch, [score for score, _ in results], ms / len(batch), tokens // len(batch))
+        for i, (score, reason) in enumerate(results, 1):
+            _say(config, f"Q {i}/{len(batch)}")
+            _say_grade(config, score, reason)
+        scores = [score for score, _ in results]
+        return {"score": sum(scores), "batch_scores": _score_records(batch, scores),
+                "ability": _updated_ability(state, scores)}
+    
+    item = batch[index]
+    if CONCURRENT_GRADING:
+        fut = _grading_pool.submit(_metered, _grade_one, item, _user_answer(state, item["q_id"]))
+        with _registry_lock:
+            _pending_grades[(_session(config), item["q_id"])] = fut
+        return {}
+
+    (score, reason), ms, tokens = _metered(_grade_one, item, _user_answer(state, item["q_id"]))
+    _log_grades(state, config, [item], [score], ms, tokens)
+    _say_grade(config, score, reason)
+
+    return {"score": score, "batch_scores": _score_records([item], [score]),
+            "ability": _updated_ability(state, [score])}
 
-def more_questions(state: AgentState) -> str:
+def _log_grades(state: AgentState, config: RunnableConfig, items: list[QAItem], scores: list[int],
+                latency_ms: float, tokens: int) -> None:
+    if response_log is None:
+        return
+    subject = subject_key(state.get("subject", ""))
+    level = LEVELS.index(state.get("level", "High School Level"))
+    for item, score in zip(items, scores):
+        response_log.append(_session(config), subject, level, item["q_id"], score, latency_ms, tokens)
+
+def _updated_ability(state: AgentState, scores: list[int]) -> dict:
+    level = state.get("level", "High School Level")
+    est = state.get("ability") or irt.prior(LEVELS.index(level), len(LEVELS))
+    return irt.update(est, LEVELS.index(level), scores)
+
+def more_questions(state: AgentState, config: RunnableConfig) -> str:
     batch = state.get("batch") or []
     cursor = state.get("cursor", 0)
-    return "more" if cursor < len(batch) else "done"
+    if cursor < len(batch) or _stream_item(config, cursor) is not None:
+        est = state.get("ability")
+        if EARLY_BATCH_EXIT and est and irt.clearly_elsewhere(est, LEVELS.index(state["level"])):
+            return "done"   # the remaining questions are at the wrong level
+        return "more"
+    return "done"
 
 
-def debug_show_batch(state: AgentState) -> AgentState:
+def debug_show_batch(state: AgentState, config: RunnableConfig) -> AgentState:
     batch = state.get("batch", [])
-    n = len(batch)
-    last_scores = state.get("batch_scores", [])
-    batch_total = sum(last_scores)
-    
-    if n and len(last_scores) != n:
-        #Not all the questions in the batch were graded
-        n_eff = max(1, len(last_scores))
-        batch_avg = batch_total/n_eff
-    else:
-        batch_avg = (batch_total / n) if n else 0.0
-
-    print("\nBatch complete.")
-    print(f"Batch avg: {batch_avg:.2f}/10")
-    print(f"Running total: {state.get('score',0)}/{state.get('question_count',0)*10}")
+    # a batch can end early (EARLY_BATCH_EXIT): only the answered questions count
+    n = min(len(batch), state.get("cursor", len(batch)))
+    if n < len(batch) and question_bank is not None:
+        question_bank.add(state.get("subject", ""), state.get("level", "High School Level"), batch[n:])
+    batch = batch[:n]
+    with _registry_lock:
+        _streams.pop(_session(config), None)
+    # batch_scores spans the whole session: pick this batch's grades by q_id, newest first
+    wanted = {item["q_id"] for item in batch}
+    graded: dict[str, int] = {}
+    for rec in reversed(state.get("batch_scores", [])):
+        if len(graded) == len(wanted):
+            break
+        if isinstance(rec, dict) and rec.get("q_id") in wanted:
+            graded.setdefault(rec["q_id"], rec["score"])
+    new = _collect_grades(state, config, batch, graded)
+    new_scores = list(new.values())
+    scores = list({**graded, **new}.values())
+    # questions left unanswered (early batch exit) do not count
+    batch_avg = sum(scores) / len(scores) if scores else 0.0
+
+    _say(config, "", "Batch complete.")
+    _say(config, f"Batch avg: {batch_avg:.2f}/10")
+    _say(config, f"Running total: {state.get('score',0) + sum(new_scores)}/{state.get('question_count',0)*10}")
 
     for i, it in enumerate(batch, 1):
-        print(f"{i}. {it['question']}")
+        _say(config, f"{i}. {it['question']}")
         if it.get("explanation"):
-            print("   exp:", it["explanation"])
-        print("   ans:", it["answer"])
-    print()
+            _say(config, f"   exp: {it['explanation']}")
+        _say(config, f"   ans: {it['answer']}")
+    _say(config, "")
 
     #print("\nSeen questions:")
     #print(state["seen_questions"])
     #print("\nResponses:")
     #print(state["responses"])
+    if new_scores:
+        return {"batch_avg": batch_avg, "score": sum(new_scores),
+                "batch_scores": [{"q_id": qid, "score": score} for qid, score in new.items()],
+                "ability": _updated_ability(state, new_scores)}
     return {"batch_avg": batch_avg}
 
-def decide_next_level(state: AgentState) -> AgentState:
-    """Promote / stay / demote one level based on batch_avg"""
+def decide_next_level(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Move to the level the ability estimate places the learner at (possibly several levels away)."""
     level: Level = state.get("level", "High School Level")
-    batch_avg = float(state.get("batch_avg", 0.0))
     idx = LEVELS.index(level)
+    est = state.get("ability") or irt.prior(idx, len(LEVELS))
+    new_idx = irt.level_index(est)
+    new_level = LEVELS[new_idx]
 
-    if batch_avg >= PROMOTE_THRESHOLD and idx < len(LEVELS) - 1:
-        new_level = LEVELS[idx + 1]
+    if new_idx > idx:
         movement = "↑ promote"
-    elif batch_avg < DEMOTE_THRESHOLD and idx > 0:
-        new_level = LEVELS[idx - 1]
+    elif new_idx < idx:
         movement = "↓ demote"
     else:
-        new_level = level
         movement = "→ stay"
 
-    print(f"Level decision: {movement} — {level} → {new_level}")
+    mean, sd = irt.posterior(est)
+    phase = "calibrated" if sd <= irt.CALIBRATED_SD else "calibrating"
+    _say(config, f"Level decision: {movement} — {level} → {new_level} (ability {mean:.2f} ± {sd:.2f}, {phase})")
+    _cancel_prefetch(_session(config), state.get("subject", ""), keep=new_level)
     return {"level": new_level}
 
-def ask_continue(state: AgentState) -> AgentState:
+def ask_continue(state: AgentState, config: RunnableConfig) -> AgentState:
     """Ask the learner if they want another batch at the (possibly new) level."""
-    choice = input("\nDo you want another batch? (y/n): ").strip().lower()
+    choice = str(interrupt("Do you want another batch? (y/n):")).strip().lower()
     cont = choice in {"y", "yes", "1"}
+    if not cont:
+        _cancel_prefetch(_session(config), state.get("subject", ""))
+        if response_log is not None:
+            response_log.flush()
+        if judge_cache is not None:
+            st = judge_cache.stats()
+            _say(config, f"Judge cache (all sessions in this process): {st['hits']} hits / "
+                         f"{st['hits'] + st['misses']} lookups ({st['hit_rate']:.0%})")
     return {"continue_flag": cont}
 
 def continue_or_end(state: AgentState) -> str:
     return "continue" if state.get("continue_flag") else "end"
 
 
-graph = StateGraph(AgentState)
+graph = metrics.instrumented(StateGraph(AgentState))
 graph.add_node("intake", intake)
 graph.add_node("generate_batch_questions", generate_batch_questions)
 graph.add_node("get_answers", get_answer)
@@ -372,19 +887,107 @@ graph.add_edge("debug_show_batch", "decide_next_level")
 graph.add_edge("decide_next_level", "ask_continue")
 graph.add_conditional_edges("ask_continue", continue_or_end, {"continue": "generate_batch_questions", "end": END})
 
-app = graph.compile()
+def make_checkpointer(path: str | None = SESSION_CHECKPOINT_PATH):
+    # pickle_fallback lets the serializer store the AppendLog channel values
+    serde = JsonPlusSerializer(pickle_fallback=True)
+    if path is None:
+        saver = MemorySaver(serde=serde)
+    else:
+        saver = IncrementalSqliteSaver(path, serde=serde)
+    return metrics.instrument_methods(saver, "checkpoint_seconds", "put", "put_writes")
+
+app = graph.compile(checkpointer=make_checkpointer())
+
+def use_checkpointer(checkpointer) -> None:
+    """Recompile `app` against another checkpointer (e.g. an async SQLite saver for ta_server.py)."""
+    global app
+    app = graph.compile(checkpointer=checkpointer)
+
+# ---------- Session API ----------
+def new_state(subject: str = "", level: Level | str = "") -> AgentState:
+    return {
+        "messages": [],
+        "question_count": 0,
+        "score": 0,
+        "subject": subject,
+        "batch": [],
+        "cursor": 0,
+        "responses": [],
+        "seen_questions": set(),
+        "batch_scores": [],
+        "level": level,  # you can preset; intake lets the user change
+    }
+
+def _session_config(thread_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id}, "recursion_limit": 200, "callbacks": SESSION_CALLBACKS}
+
+def _turn_result(thread_id: str, snapshot) -> dict:
+    """Output produced since the last turn, plus the prompt the session is now waiting on."""
+    prompts = [intr.value for task in snapshot.tasks for intr in task.interrupts]
+    return {"output": _outbox.pop(thread_id, []),
+            "prompt": prompts[0] if prompts else None,
+            "done": not snapshot.next}
+
+def start_session(thread_id: str, subject: str = "", level: Level | str = "") -> dict:
+    """Start a learner session; runs until the first question for the learner."""
+    config = _session_config(thread_id)
+    app.invoke(new_state(subject, level), config=config)
+    return _turn_result(thread_id, app.get_state(config))
+
+def reply(thread_id: str, user_reply: str) -> dict:
+    """Resume a paused session with the learner's reply; runs until the next question or the end."""
+    config = _session_config(thread_id)
+    app.invoke(Command(resume=user_reply), config=config)
+    return _turn_result(thread_id, app.get_state(config))
+
+async def astart_session(thread_id: str, subject: str = "", level: Level | str = "") -> dict:
+    """Async start_session() for servers sharing one event loop between many learners."""
+    config = _session_config(thread_id)
+    await app.ainvoke(new_state(subject, level), config=config)
+    return _turn_result(thread_id, await app.aget_state(config))
+
+def resume_session(thread_id: str) -> dict | None:
+    """Re-show the prompt a checkpointed session is paused on (e.g. after a restart); None if the
+    learner has no unfinished session."""
+    snapshot = app.get_state(_session_config(thread_id))
+    if not snapshot.next:
+        return None
+    return _turn_result(thread_id, snapshot)
+
+async def aresume_session(thread_id: str) -> dict | None:
+    """Async resume_session()."""
+    snapshot = await app.aget_state(_session_config(thread_id))
+    if not snapshot.next:
+        return None
+    return _turn_result(thread_id, snapshot)
+
+async def areply(thread_id: str, user_reply: str) -> dict:
+    """Async reply()."""
+    config = _session_config(thread_id)
+    await app.ainvoke(Command(resume=user_reply), config=config)
+    return _turn_result(thread_id, await app.aget_state(config))
+
+def release_session(thread_id: str) -> None:
+    """Forget a session's in-process work (prefetches, streamed batch, background grades, unread
+    output), e.g. when a server drops an idle learner. The checkpoint is kept, so the session can
+    still be resumed; grades lost here are redone when the batch summary runs."""
+    with _registry_lock:
+        futures = [_prefetched.pop(k) for k in [k for k in _prefetched if k[0] == thread_id]]
+        futures += [_pending_grades.pop(k) for k in [k for k in _pending_grades if k[0] == thread_id]]
+        _streams.pop(thread_id, None)
+    for fut in futures:
+        fut.cancel()     # running ones finish on their own; nobody waits for them
+    _outbox.pop(thread_id, None)
 
 # ---------- Run ----------
-init: AgentState = {
-    "messages": [],
-    "question_count": 0,
-    "score": 0,
-    "subject": "",
-    "batch": [],
-    "cursor": 0,
-    "responses": [],
-    "seen_questions": [],
-    "batch_scores": [],
-    "level": "",  # you can preset; intake lets the user change
-}
-final_state = app.invoke(init, config={"recursion_limit": 200})
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    # python prototype_code_final.py [learner_id]: resumes that learner's unfinished session if any
+    thread_id = sys.argv[1] if len(sys.argv) > 1 else str(uuid.uuid4())
+    turn = resume_session(thread_id) or start_session(thread_id)
+    while True:
+        for line in turn["output"]:
+            print(line)
+        if turn["done"]:
+            break
+        turn = reply(thread_id, input(f"\n{turn['prompt']} "))
@@ -0,0 +1,160 @@
+"""Persistent bank of validated questions per (subject, level), topped up in the background."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from seen_index import question_hash
+
+
+def subject_key(subject: str) -> str:
+    return " ".join(str(subject).split()).casefold()
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha1(" ".join(question.split()).casefold().encode("utf-8")).hexdigest()
+
+
+def _signed(h: int) -> int:
+    """seen_index.question_hash as a signed 64-bit SQLite INTEGER."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+class QuestionBank:
+    """SQLite store of QAItems. `take` serves unseen items; when a learner is running low on
+    unseen items for a (subject, level) pool, `generate_fn(subject, level)` is called on a
+    background worker to add more.
+
+    Each row stores its question_hash, so items the learner has already been asked are
+    excluded in SQL and only a LIMITed page of candidates is read; the caller's paraphrase
+    check runs on those candidates only."""
+
+    MAX_PAGES = 4     # a pool whose oldest items are all paraphrases of seen ones counts as running low
+
+    def __init__(self, path: str = "question_bank.sqlite3",
+                 generate_fn: Callable[[str, str], list[dict]] | None = None,
+                 low_watermark: int = 10, refill_batches: int = 2, workers: int = 1):
+        self.generate_fn = generate_fn
+        self.low_watermark = low_watermark
+        self.refill_batches = refill_batches
+        self._lock = threading.Lock()
+        self._refilling: set[tuple[str, str]] = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank-refill")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " subject TEXT NOT NULL, level TEXT NOT NULL, qkey TEXT NOT NULL,"
+            " q_id TEXT NOT NULL, question TEXT NOT NULL, explanation TEXT NOT NULL,"
+            " answer TEXT NOT NULL, answer_type TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (subject, level, qkey))"
+        )
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(questions)")]
+        if "qhash" not in columns:     # banks created before the column existed
+            self._conn.execute("ALTER TABLE questions ADD COLUMN qhash INTEGER")
+            rows = self._conn.execute("SELECT rowid, question FROM questions").fetchall()
+            self._conn.executemany("UPDATE questions SET qhash = ? WHERE rowid = ?",
+                                   [(_signed(question_hash(q)), rowid) for rowid, q in rows])
+        self._conn.execute("CREATE INDEX IF NOT EXISTS questions_by_age ON questions(subject, level, created)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS questions_by_hash ON questions(qhash)")
+        self._conn.commit()
+
+    def add(self, subject: str, level: str, items: Iterable[dict]) -> int:
+        """Store validated items; duplicates of questions already in the pool are ignored, and so are
+        items marked `local` (answered by the local model, whose answers are not checked)."""
+        rows = [(subject_key(subject), level, question_key(it["question"]), it["q_id"], it["question"],
+                 it.get("explanation", ""), it["answer"], it["answer_type"], time.time(),
+                 _signed(question_hash(it["question"])))
+                for it in items if not it.get("local")]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions (subject, level, qkey, q_id, question, explanation, answer,"
+                " answer_type, created, qhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def _unseen(self, subject: str, level: str, want: int, seen_hashes: Iterable[int],
+                is_seen: Callable[[str], bool] | None) -> list[tuple]:
+        """Up to `want` rows, oldest first, whose hash is not in `seen_hashes` and which `is_seen`
+        does not reject; at most MAX_PAGES pages of candidates are read."""
+        seen_json = json.dumps([_signed(h) for h in seen_hashes])
+        page = max(2 * want, 16)
+        unseen: list[tuple] = []
+        offset = 0
+        for _ in range(self.MAX_PAGES):
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT q_id, question, explanation, answer, answer_type FROM questions"
+                    " WHERE subject = ? AND level = ? AND qhash NOT IN (SELECT value FROM json_each(?))"
+                    " ORDER BY created LIMIT ? OFFSET ?",
+                    (subject_key(subject), level, seen_json, page, offset)).fetchall()
+            unseen += [r for r in rows if is_seen is None or not is_seen(r[1])]
+            if len(unseen) >= want or len(rows) < page:
+                break
+            offset += page
+        return unseen[:want]
+
+    def take(self, subject: str, level: str, n: int, seen_hashes: Iterable[int] = (),
+             is_seen: Callable[[str], bool] | None = None) -> list[dict]:
+        """Return up to n items the learner has not seen (`seen_hashes` are question_hash values;
+        `is_seen` is an extra check such as a paraphrase test), oldest first, and schedule a
+        refill if fewer than `low_watermark` unseen items remain afterwards."""
+        unseen = self._unseen(subject, level, n + self.low_watermark, seen_hashes, is_seen)
+        batch = [{"q_id": r[0], "question": r[1], "explanation": r[2], "answer": r[3], "answer_type": r[4]}
+                 for r in unseen[:n]]
+        if len(unseen) - len(batch) < self.low_watermark:
+            self.request_refill(subject, level)
+        return batch
+
+    def available(self, subject: str, level: str, n: int, seen_hashes: Iterable[int] = (),
+                  is_seen: Callable[[str], bool] | None = None) -> bool:
+        """Whether `take` could serve n items now; reads at most a page and queues no refill."""
+        return len(self._unseen(subject, level, n, seen_hashes, is_seen)) >= n
+
+    def questions_by_hash(self, hashes: Iterable[int]) -> dict[int, str]:
+        """{question_hash: question text} for the hashes the bank knows (any pool); lets a
+        SeenIndex rebuild paraphrase fingerprints without keeping them in session state."""
+        wanted = json.dumps([_signed(h) for h in hashes])
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT qhash, question FROM questions WHERE qhash IN (SELECT value FROM json_each(?))",
+                (wanted,)).fetchall()
+        return {h % (1 << 64): q for h, q in rows}
+
+    def questions(self, subject: str, level: str) -> list[str]:
+        """Text of every question in the pool."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT question FROM questions WHERE subject = ? AND level = ?",
+                                                     (subject_key(subject), level))]
+
+    def count(self, subject: str, level: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions WHERE subject = ? AND level = ?",
+                                      (subject_key(subject), level)).fetchone()[0]
+
+    def request_refill(self, subject: str, level: str) -> None:
+        """Queue a background top-up of the pool; at most one refill per pool is in flight."""
+        if self.generate_fn is None:
+            return
+        key = (subject_key(subject), level)
+        with self._lock:
+            if key in self._refilling:
+                return
+            self._refilling.add(key)
+        self._pool.submit(self._refill, subject, level, key)
+
+    def _refill(self, subject: str, level: str, key: tuple[str, str]) -> None:
+        try:
+            for _ in range(self.refill_batches):
+                self.add(subject, level, self.generate_fn(subject, level))
+        except Exception as e:
+            print(f"[question bank] refill failed for {subject!r} / {level}: {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
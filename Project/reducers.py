@@ -0,0 +1,124 @@
+"""State reducers whose update cost does not grow with the channel.
+
+`ex + nw` copies the whole channel on every update. AppendLog and OrderedSet instead share
+one backing buffer between successive versions: extending the newest version appends in
+place and returns a longer view, so older views are unchanged and an update costs O(len(new)).
+Extending an older version (a fork) copies its prefix first, so values stay immutable."""
+from collections.abc import Iterable, Sequence
+import threading
+
+
+class AppendLog(Sequence):
+    """Immutable, append-only sequence with structurally shared storage."""
+
+    __slots__ = ("_buf", "_n", "_lock")
+
+    def __init__(self, items: Iterable = ()):
+        self._buf = list(items)
+        self._n = len(self._buf)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _view(cls, buf: list, n: int, lock: threading.Lock) -> "AppendLog":
+        view = cls.__new__(cls)
+        view._buf, view._n, view._lock = buf, n, lock
+        return view
+
+    def extend(self, items: Iterable) -> "AppendLog":
+        items = list(items)
+        if not items:
+            return self
+        with self._lock:
+            if self._n == len(self._buf):
+                self._buf.extend(items)
+                return self._view(self._buf, len(self._buf), self._lock)
+        return AppendLog(self._buf[:self._n] + items)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            buf = self._buf
+            return [buf[j] for j in range(self._n)[i]]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("AppendLog index out of range")
+        return self._buf[i]
+
+    def __iter__(self):
+        buf = self._buf
+        for i in range(self._n):
+            yield buf[i]
+
+    def __reversed__(self):
+        buf = self._buf
+        for i in range(self._n - 1, -1, -1):
+            yield buf[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __add__(self, other: Iterable) -> list:
+        return list(self) + list(other)
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
+
+
+class OrderedSet(AppendLog):
+    """AppendLog that ignores items it already contains; membership is O(1)."""
+
+    __slots__ = ("_pos",)
+
+    def __init__(self, items: Iterable = ()):
+        self._pos: dict = {}
+        super().__init__(())
+        self._append_new(items)
+        self._n = len(self._buf)
+
+    def _append_new(self, items: Iterable) -> None:
+        for item in items:
+            if item not in self._pos:
+                self._pos[item] = len(self._buf)
+                self._buf.append(item)
+
+    def extend(self, items: Iterable) -> "OrderedSet":
+        items = [it for it in items if it not in self]
+        if not items:
+            return self
+        with self._lock:
+            if self._n == len(self._buf):
+                self._append_new(items)
+                view = self._view(self._buf, len(self._buf), self._lock)
+                view._pos = self._pos
+                return view
+        return OrderedSet(list(self) + items)
+
+    def __contains__(self, item) -> bool:
+        pos = self._pos.get(item)
+        return pos is not None and pos < self._n
+
+
+def sum_counts(existing: int | None, new: int | None) -> int:
+    ex = existing if existing else 0
+    nw = new if new else 0
+    return ex + nw
+
+
+def append(existing: Sequence | None, new: Sequence | None) -> AppendLog:
+    """Reducer: append `new` to the channel in O(len(new))."""
+    ex = existing if isinstance(existing, AppendLog) else AppendLog(existing or ())
+    return ex.extend(new) if new else ex
+
+
+def append_unique(existing: Sequence | None, new: Sequence | None) -> OrderedSet:
+    """Reducer: append the non-empty items of `new` not already in the channel, keeping first-seen order."""
+    ex = existing if isinstance(existing, OrderedSet) else OrderedSet(existing or ())
+    return ex.extend(n for n in new if n) if new else ex
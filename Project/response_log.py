@@ -0,0 +1,149 @@
+"""Append-only columnar log of graded responses.
+
+A log is a directory with one raw file per column (native-endian fixed-width values, written with
+`array.tofile`) and, for string columns, a dictionary file (one JSON string per line; the column
+stores the line number). Appends are buffered and flushed in blocks; readers mmap the column files
+and get zero-copy typed memoryviews, so scanning millions of rows never builds per-row objects.
+If a flush is cut short the columns can end up with different lengths: readers use the shortest,
+and reopening the log for writing truncates the others back to it."""
+from array import array
+import json
+import mmap
+import os
+import threading
+import time
+
+# column -> array typecode
+COLUMNS = {
+    "ts": "d",            # unix time the grade was recorded
+    "learner": "I",       # dictionary-encoded thread id
+    "subject": "I",       # dictionary-encoded, normalized subject
+    "level": "B",         # index into LEVELS
+    "q_id": "I",          # dictionary-encoded question id
+    "score": "B",         # 0..10
+    "latency_ms": "f",    # grading wall time
+    "tokens": "I",        # judge tokens spent on this grade (0 when answered locally or from cache)
+}
+DICTIONARY_COLUMNS = ("learner", "subject", "q_id")
+
+
+def _column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.col")
+
+
+def _dictionary_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.dict")
+
+
+def _read_dictionary(path: str, name: str) -> list[str]:
+    try:
+        with open(_dictionary_path(path, name), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _row_count(path: str) -> int:
+    counts = []
+    for name, code in COLUMNS.items():
+        try:
+            counts.append(os.path.getsize(_column_path(path, name)) // array(code).itemsize)
+        except FileNotFoundError:
+            counts.append(0)
+    return min(counts)
+
+
+class ResponseLog:
+    """Writer; safe to share between threads."""
+
+    def __init__(self, path: str, flush_every: int = 256):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        rows = _row_count(path)
+        for name, code in COLUMNS.items():   # drop the tail of a torn flush
+            with open(_column_path(path, name), "ab") as f:
+                f.truncate(rows * array(code).itemsize)
+        self._codes = {name: {v: i for i, v in enumerate(_read_dictionary(path, name))}
+                       for name in DICTIONARY_COLUMNS}
+        self._pending = {name: array(code) for name, code in COLUMNS.items()}
+        self._new_words: dict[str, list[str]] = {name: [] for name in DICTIONARY_COLUMNS}
+
+    def append(self, learner: str, subject: str, level: int, q_id: str, score: int,
+               latency_ms: float = 0.0, tokens: int = 0, ts: float | None = None) -> None:
+        row = {"ts": time.time() if ts is None else ts, "learner": learner, "subject": subject,
+               "level": level, "q_id": q_id, "score": min(max(int(score), 0), 10),
+               "latency_ms": latency_ms, "tokens": tokens}
+        with self._lock:
+            for name in DICTIONARY_COLUMNS:
+                row[name] = self._encode(name, str(row[name]))
+            for name, column in self._pending.items():
+                column.append(row[name])
+            if len(self._pending["ts"]) >= self.flush_every:
+                self._flush()
+
+    def _encode(self, name: str, value: str) -> int:
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self._new_words[name].append(value)
+        return code
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        # dictionary entries first, so every code on disk resolves
+        for name, words in self._new_words.items():
+            if words:
+                with open(_dictionary_path(self.path, name), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(w, ensure_ascii=False) + "\n" for w in words)
+                words.clear()
+        for name, column in self._pending.items():
+            if column:
+                with open(_column_path(self.path, name), "ab") as f:
+                    column.tofile(f)
+                del column[:]
+
+    def close(self) -> None:
+        self.flush()
+
+
+class ColumnReader:
+    """Read-only, memory-mapped view of a log: `reader["score"]` is a typed memoryview."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = _row_count(path)
+        self._maps: list[mmap.mmap] = []
+        self._columns: dict[str, memoryview] = {}
+        for name, code in COLUMNS.items():
+            size = self.rows * array(code).itemsize
+            if size == 0:
+                self._columns[name] = memoryview(array(code))
+                continue
+            with open(_column_path(path, name), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mm)
+            self._columns[name] = memoryview(mm)[:size].cast(code)
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self._columns[name]
+
+    def dictionary(self, name: str) -> list[str]:
+        return _read_dictionary(self.path, name)
+
+    def close(self) -> None:
+        for view in self._columns.values():
+            view.release()
+        for mm in self._maps:
+            mm.close()
+
+    def __enter__(self) -> "ColumnReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,213 @@
+"""Compact record of the questions a learner has already been asked, with near-duplicate lookup.
+
+Session state holds only the set of 64-bit question hashes. MinHash fingerprints live in a bounded
+process-wide cache and are rebuilt from question text (the question bank) for hashes the cache
+does not know, e.g. after a session is resumed in a fresh process; they are never checkpointed."""
+from collections import OrderedDict
+from typing import Callable, Iterable
+import hashlib
+import re
+import threading
+
+# MinHash / LSH parameters: NUM_PERM = BANDS * ROWS
+NUM_PERM = 32
+BANDS = 16
+ROWS = 2
+# Content-word coverage at which a question counts as a paraphrase (see is_paraphrase);
+# LSH over MinHash signatures only finds the candidates to compare.
+NEAR_DUP_THRESHOLD = 0.7
+# Shared fraction of the larger word set above which one substituted word is still a paraphrase
+SUBSTITUTION_THRESHOLD = 0.8
+FINGERPRINT_CACHE_SIZE = 200_000
+
+_MERSENNE = (1 << 61) - 1
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+_STOPWORDS = frozenset(
+    "a an the of in on at to for by with from and or is are was were be been what which who whom whose "
+    "how why when where does do did can could would should will this that these those it its as s".split()
+)
+
+
+def _h64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def question_hash(question: str) -> int:
+    """Stable 64-bit hash of a question, insensitive to case and whitespace."""
+    return _h64(" ".join(str(question).split()).casefold())
+
+
+_IRREGULAR = {"has": "have", "had": "have", "having": "have"}
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, so inflections compare equal ("moons"/"moon", "has"/"have")."""
+    word = _IRREGULAR.get(word, word)
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 3 and word.endswith("e") else word
+
+
+def content_words(question: str) -> frozenset[str]:
+    """Stemmed, lower-cased words minus stopwords; insensitive to word order and punctuation."""
+    return frozenset(_stem(w) for w in re.findall(r"[^\W_]+", str(question).casefold()) if w not in _STOPWORDS)
+
+
+def pinned_words(question: str) -> frozenset[str]:
+    """Content words that name something (numbers, capitalized words after the first):
+    questions that differ in one of these are about different things."""
+    words = re.findall(r"[^\W_]+", str(question))
+    return frozenset(_stem(w.casefold()) for i, w in enumerate(words)
+                     if w.casefold() not in _STOPWORDS and (any(c.isdigit() for c in w) or (i and w[0].isupper())))
+
+
+def minhash(question: str) -> tuple[int, ...]:
+    hashes = [_h64(w) for w in content_words(question)] or [0]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMS)
+
+
+def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+# (MinHash signature, content words, pinned words)
+Fingerprint = tuple[tuple[int, ...], frozenset[str], frozenset[str]]
+
+
+def fingerprint(question: str) -> Fingerprint:
+    return minhash(question), content_words(question), pinned_words(question)
+
+
+def is_paraphrase(a: Fingerprint, b: Fingerprint, threshold: float = NEAR_DUP_THRESHOLD) -> bool:
+    """One question's content words contain the other's, and cover at least `threshold` of them:
+    words may be reordered, inflected or a few added. One substituted word is allowed when the
+    rest overlaps by SUBSTITUTION_THRESHOLD, unless either word is a number or a name.
+
+    >>> is_paraphrase(fingerprint("What is the boiling point of water in Celsius?"),
+    ...               fingerprint("What is the freezing point of water in Celsius?"))
+    False
+    >>> is_paraphrase(fingerprint("What is the boiling point of water in Celsius?"),
+    ...               fingerprint("In Celsius, what's water's boiling point?"))
+    True
+    >>> is_paraphrase(fingerprint("How many moons does Mars have?"),
+    ...               fingerprint("Mars has how many moons?"))
+    True
+    >>> is_paraphrase(fingerprint("Which is the biggest planet in our Solar System?"),
+    ...               fingerprint("Which is the largest planet in our Solar System?"))
+    True
+    >>> is_paraphrase(fingerprint("How many moons orbit Mars in our Solar System today?"),
+    ...               fingerprint("How many moons orbit Venus in our Solar System today?"))
+    False
+    """
+    small, large = sorted((a[1], b[1]), key=len)
+    extra_small, extra_large = small - large, large - small
+    if not extra_small:
+        return len(small) >= threshold * len(large)
+    if len(extra_small) > 1 or len(extra_large) > 1:
+        return False
+    if (extra_small | extra_large) & (a[2] | b[2]):
+        return False    # a different number or name: a different question
+    return len(small & large) >= SUBSTITUTION_THRESHOLD * len(large)
+
+
+_cache: OrderedDict[int, Fingerprint] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def remember(question: str) -> Fingerprint:
+    """Fingerprint of `question`, kept in the process cache under its question_hash."""
+    qhash = question_hash(question)
+    with _cache_lock:
+        fp = _cache.get(qhash)
+        if fp is not None:
+            _cache.move_to_end(qhash)
+            return fp
+    fp = fingerprint(question)
+    with _cache_lock:
+        _cache[qhash] = fp
+        while len(_cache) > FINGERPRINT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return fp
+
+
+def fingerprints(hashes: Iterable[int], lookup: Callable[[list[int]], dict[int, str]] | None = None) -> list[Fingerprint]:
+    """Fingerprints for `hashes`; misses are rebuilt from `lookup(hashes) -> {hash: question}`.
+    Hashes neither cached nor found still match exactly, just not as paraphrases."""
+    found, missing = [], []
+    with _cache_lock:
+        for h in hashes:
+            fp = _cache.get(h)
+            if fp is None:
+                missing.append(h)
+            else:
+                _cache.move_to_end(h)
+                found.append(fp)
+    if missing and lookup is not None:
+        found += [remember(question) for question in lookup(missing).values()]
+    return found
+
+
+class NearDuplicateIndex:
+    """LSH index over fingerprints; `is_near_duplicate` only compares against bucket collisions."""
+
+    def __init__(self, fps=(), threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[Fingerprint]] = {}
+        for fp in fps:
+            self.add(fp)
+
+    @staticmethod
+    def _bands(sig: tuple[int, ...]):
+        for b in range(BANDS):
+            yield b, tuple(sig[b * ROWS:(b + 1) * ROWS])
+
+    def add(self, fp: Fingerprint) -> None:
+        for key in self._bands(fp[0]):
+            self._buckets.setdefault(key, []).append(fp)
+
+    def is_near_duplicate(self, fp: Fingerprint) -> bool:
+        for key in self._bands(fp[0]):
+            for other in self._buckets.get(key, ()):
+                if is_paraphrase(fp, other, self.threshold):
+                    return True
+        return False
+
+
+def merge_seen(existing: set[int] | None, new: set[int] | None) -> set[int]:
+    """Reducer for the seen-question channel: set union of 64-bit question hashes."""
+    ex = existing if existing else set()
+    if not new:
+        return ex
+    return ex | set(new)
+
+
+class SeenIndex:
+    """Exact-hash plus near-duplicate membership test over a learner's seen questions.
+
+    `question in index` is True for questions already asked and for their paraphrases."""
+
+    def __init__(self, seen: Iterable[int] = (), lookup: Callable[[list[int]], dict[int, str]] | None = None):
+        self.hashes = set(seen)
+        self._lsh = NearDuplicateIndex(fingerprints(self.hashes, lookup))
+
+    def __contains__(self, question: str) -> bool:
+        if question_hash(question) in self.hashes:
+            return True
+        return self._lsh.is_near_duplicate(fingerprint(question))
+
+    def add(self, question: str) -> None:
+        qhash = question_hash(question)
+        if qhash not in self.hashes:
+            self.hashes.add(qhash)
+            self._lsh.add(remember(question))
@@ -0,0 +1,70 @@
+"""Incremental parser that yields each `items[i]` object of a streamed `{"items": [...]}` JSON reply
+as soon as its closing brace arrives."""
+import json
+
+
+class ItemStreamParser:
+    """Feed text chunks; `feed` returns the item dicts completed by that chunk."""
+
+    def __init__(self, key: str = "items"):
+        self.key = key
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start: int | None = None
+        self._pos = 0
+        self._in_items = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        out = []
+        for ch in chunk:
+            self._buf.append(ch)
+            pos = self._pos
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2:
+                    self._in_items = self._last_key() == self.key
+                elif ch == "{" and self._depth == 3 and self._in_items:
+                    self._item_start = pos
+            elif ch in "}]":
+                if ch == "}" and self._depth == 3 and self._item_start is not None:
+                    text = "".join(self._buf[self._item_start:pos + 1])
+                    self._item_start = None
+                    try:
+                        item = json.loads(text)
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        out.append(item)
+                elif ch == "]" and self._depth == 2:
+                    self._in_items = False
+                self._depth -= 1
+            if self._item_start is None and self._depth <= 2:
+                # nothing before the current item is needed again except the key lookup window
+                if len(self._buf) > 256:
+                    del self._buf[:-64]
+                    self._pos = len(self._buf)
+        return out
+
+    def _last_key(self) -> str | None:
+        """The JSON key immediately preceding the current `[` (looks back over the recent buffer)."""
+        text = "".join(self._buf[-64:-1]).rstrip()
+        if not text.endswith(":"):
+            return None
+        text = text[:-1].rstrip()
+        if not text.endswith('"'):
+            return None
+        start = text.rfind('"', 0, len(text) - 1)
+        return text[start + 1:-1] if start >= 0 else None
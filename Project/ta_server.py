@@ -0,0 +1,111 @@
+"""Long-running async server for the teaching assistant.
+
+One process compiles the graph and creates the LLM clients once, then serves many learner
+sessions concurrently on a single event loop. Protocol: newline-delimited JSON over TCP.
+
+    -> {"thread_id": "alice", "subject": "astronomy", "level": ""}   # start (subject/level optional)
+    -> {"thread_id": "alice", "reply": "Jupiter"}                     # answer the pending prompt
+    -> {"thread_id": "alice", "resume": true}                         # re-show the pending prompt
+    <- {"output": [...], "prompt": "Q 2/5: ...\\nYour answer:", "done": false}
+    -> {"metrics": "json"}                                             # or "prometheus"
+    <- {"metrics": "..."}
+
+Learners silent for --idle-timeout seconds have their in-process work released; their
+checkpoint stays, so {"resume": true} picks the session up again.
+
+Run: python Project/ta_server.py --port 8765 --max-llm-calls 32
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+import argparse
+import asyncio
+import json
+import time
+
+import instrumentation as metrics
+import prototype_code_final as ta
+
+_session_locks: dict[str, asyncio.Lock] = {}
+_last_active: dict[str, float] = {}
+
+
+async def handle_request(msg: dict) -> dict:
+    if "metrics" in msg:
+        return {"metrics": metrics.to_prometheus() if msg["metrics"] == "prometheus" else metrics.snapshot()}
+    thread_id = str(msg["thread_id"])
+    # one turn at a time per learner; different learners run concurrently
+    lock = _session_locks.setdefault(thread_id, asyncio.Lock())
+    _last_active[thread_id] = time.monotonic()
+    async with lock:
+        if "reply" in msg:
+            turn = await ta.areply(thread_id, str(msg["reply"]))
+        elif msg.get("resume"):
+            turn = await ta.aresume_session(thread_id)
+            if turn is None:
+                return {"error": f"no unfinished session for {thread_id}"}
+        else:
+            turn = await ta.astart_session(thread_id, msg.get("subject", ""), msg.get("level", ""))
+    _last_active[thread_id] = time.monotonic()
+    if turn["done"]:
+        _session_locks.pop(thread_id, None)
+        _last_active.pop(thread_id, None)
+    return turn
+
+
+async def release_idle_sessions(idle_timeout: float) -> None:
+    """Periodically drop the in-process state of learners who stopped replying."""
+    while True:
+        await asyncio.sleep(min(60.0, idle_timeout))
+        cutoff = time.monotonic() - idle_timeout
+        for thread_id in [t for t, ts in _last_active.items() if ts < cutoff]:
+            lock = _session_locks.get(thread_id)
+            if lock is not None and lock.locked():
+                continue    # a turn is still running
+            _session_locks.pop(thread_id, None)
+            _last_active.pop(thread_id, None)
+            ta.release_session(thread_id)
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while line := await reader.readline():
+            try:
+                response = await handle_request(json.loads(line))
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    # Sync nodes run on the loop's default executor; size it for the expected concurrency.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="ta-node"))
+    ta.set_llm_concurrency(args.max_llm_calls)
+
+    async with AsyncExitStack() as stack:
+        if args.checkpoint != ta.SESSION_CHECKPOINT_PATH:
+            ta.use_checkpointer(ta.make_checkpointer(args.checkpoint or None))
+
+        reaper = asyncio.create_task(release_idle_sessions(args.idle_timeout))
+        stack.callback(reaper.cancel)
+        server = await stack.enter_async_context(
+            await asyncio.start_server(handle_connection, args.host, args.port))
+        print(f"Teaching assistant listening on {args.host}:{args.port}")
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=64, help="threads for running graph nodes")
+    parser.add_argument("--max-llm-calls", type=int, default=ta.MAX_CONCURRENT_LLM_CALLS,
+                        help="cap on generator/judge requests in flight")
+    parser.add_argument("--checkpoint", default=ta.SESSION_CHECKPOINT_PATH,
+                        help="SQLite file for session checkpoints ('' keeps them in memory)")
+    parser.add_argument("--idle-timeout", type=float, default=1800.0,
+                        help="seconds without a request after which a learner's in-process work is released")
+    asyncio.run(main(parser.parse_args()))
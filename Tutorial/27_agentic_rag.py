@@ -6,62 +6,36 @@ from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, To
 from operator import add as add_messages
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_core.tools import tool
+from rag_index import sync_pdf
+from embedding_cache import CachedEmbeddings
+from bm25_index import BM25Index, HybridRetriever
 
 load_dotenv()
 
 llm = ChatOpenAI(model = "gpt-4o-mini", temperature = 0)
 
-embeddings = OpenAIEmbeddings(model = "text-embedding-3-small")
+# Ingestion and retrieval share one on-disk cache, so repeated texts and queries are embedded once
+embeddings = CachedEmbeddings(OpenAIEmbeddings(model = "text-embedding-3-small"))
 
 pdf_path = "astronomy.pdf"
 
 if not os.path.exists(pdf_path):
     raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-pdf_loader = PyPDFLoader(pdf_path)
-
-try:
-    pages = pdf_loader.load()
-    print(f"PDF has been loaded and has {len(pages)} pages")
-except Exception as e:
-    print(f"Error loading PDF: {e}")
-    raise
-
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size = 1000,
     chunk_overlap = 200
 )
 
-pages_split = text_splitter.split_documents(pages)
-
 persist_directory = r"/Users/balakrishnannagaraj/Documents/Work/LangGraph/"
 collection_name = "astronomy"
 
 if not os.path.exists(persist_directory):
     os.makedirs(persist_directory)
 
-try:
-    vectorstore = Chroma.from_documents(
-        documents=pages_split,
-        embedding=embeddings,
-        persist_directory=persist_directory,
-        collection_name=collection_name
-    )
-    print(f"Created ChromaDB vector store")
-
-except Exception as e:
-    print(f"Error setting up ChromaDB: {str(e)}")
-    raise
-
-retriever = vectorstore.as_retriever(
-    search_type = "similarity",
-    search_kwargs = {"k": 5}
-)
-
 @tool
 def retriever_tool(query: str) -> str:
     """This tool searches and returns the information from the     document."""
@@ -144,8 +118,40 @@ def running_agent():
         result = rag_agent.invoke({"messages": messages})
         print("\n=== ANSWER ===")
         print(result["messages"][-1].content)
-
-running_agent()
+        st = embeddings.stats()
+        print(f"\nEmbedding cache: {st['hits']} hits / {st['hits'] + st['misses']} lookups ({st['hit_rate']:.0%})")
+
+# Ingestion parses the PDF in worker processes, which re-import this file on macOS/Windows:
+# only the main process may build the index and start the agent.
+if __name__ == "__main__":
+    try:
+        keyword_index = BM25Index(os.path.join(persist_directory, f"{collection_name}_bm25.sqlite3"))
+        vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=persist_directory
+        )
+        # Only new or changed chunks are embedded; vectors of removed chunks are deleted.
+        stats = sync_pdf(
+            pdf_path,
+            vectorstore,
+            text_splitter,
+            manifest_path=os.path.join(persist_directory, f"{collection_name}_manifest.json"),
+            settings={"embedding_model": embeddings.model, "chunk_size": 1000, "chunk_overlap": 200},
+            keyword_index=keyword_index
+        )
+        print(f"ChromaDB vector store ready: {stats['added']} chunks added, "
+              f"{stats['removed']} removed, {stats['kept']} unchanged")
+
+    except Exception as e:
+        print(f"Error setting up ChromaDB: {str(e)}")
+        raise
+
+    # Exact terms (object names, constants) come from BM25, paraphrases from the vectors;
+    # the two top-20 lists are merged by reciprocal-rank fusion.
+    retriever = HybridRetriever(vectorstore, keyword_index, k = 5, fetch_k = 20)
+
+    running_agent()
 
 
     
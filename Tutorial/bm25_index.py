@@ -0,0 +1,155 @@
+"""Persistent BM25 keyword index over the RAG chunks, and hybrid retrieval that fuses it with the
+vector store by reciprocal-rank fusion (used by 27_agentic_rag.py).
+
+Similarity search misses exact-term queries (catalog names like "NGC 224", constants, formulas);
+BM25 catches those and the vector side catches paraphrases. The index is an inverted index in
+SQLite next to the Chroma collection, keyed by the same chunk ids, and is kept in sync by
+rag_index.sync_pdf."""
+from collections import Counter
+import json
+import math
+import re
+import sqlite3
+import threading
+
+from langchain_core.documents import Document
+
+from rag_index import chunk_id
+
+# words, plus numbers/designations kept whole: "m31", "6.67e-11", "ngc-224", "h-alpha"
+_TOKEN = re.compile(r"[^\W_]+(?:[.\-'][^\W_]+)*")
+_NUMBER = re.compile(r"[\d.]+(?:e-?\d+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "which with what when where who how why do does did can".split())
+TOKENIZER_VERSION = 2     # bump when tokenize() changes: the index is rebuilt on open
+
+
+def tokenize(text: str) -> list[str]:
+    """Joined tokens plus their parts ("ngc-224" -> "ngc-224", "ngc", "224"), for text and queries
+    alike, so "NGC 224" and "NGC-224" match either spelling. Numbers are not split."""
+    tokens = []
+    for t in _TOKEN.findall(text.casefold()):
+        if t in STOPWORDS:
+            continue
+        tokens.append(t)
+        if not _NUMBER.fullmatch(t):
+            parts = re.split(r"[.\-']", t)
+            if len(parts) > 1:
+                tokens += [p for p in parts if len(p) > 1 and p not in STOPWORDS]
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts; safe to share between threads."""
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL,"
+            " text TEXT NOT NULL, metadata TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, id));"
+            "CREATE INDEX IF NOT EXISTS postings_by_id ON postings(id);"
+        )
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != TOKENIZER_VERSION:
+            # postings from another tokenizer would not match queries; sync_pdf refills from Chroma
+            self._conn.executescript("DELETE FROM postings; DELETE FROM terms; DELETE FROM docs;")
+            self._conn.execute(f"PRAGMA user_version = {TOKENIZER_VERSION}")
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def missing(self, ids: list[str]) -> list[str]:
+        """The ids in `ids` that are not indexed."""
+        have = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                have.update(r[0] for r in self._conn.execute(
+                    f"SELECT id FROM docs WHERE id IN ({','.join('?' * len(part))})", part))
+        return [i for i in ids if i not in have]
+
+    def add(self, ids: list[str], docs: list[Document]) -> None:
+        with self._lock:
+            for i, doc in zip(ids, docs):
+                tf = Counter(tokenize(doc.page_content))
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO docs (id, length, text, metadata) VALUES (?, ?, ?, ?)",
+                    (i, sum(tf.values()), doc.page_content, json.dumps(doc.metadata or {}, ensure_ascii=False)))
+                if not cur.rowcount:
+                    continue    # same id = same content, already indexed
+                self._conn.executemany("INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)",
+                                       [(t, i, n) for t, n in tf.items()])
+                self._conn.executemany("INSERT INTO terms (term, df) VALUES (?, 1)"
+                                       " ON CONFLICT(term) DO UPDATE SET df = df + 1", [(t,) for t in tf])
+            self._conn.commit()
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            for i in ids:
+                terms = [r[0] for r in self._conn.execute("SELECT term FROM postings WHERE id = ?", (i,))]
+                self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(t,) for t in terms])
+                self._conn.execute("DELETE FROM postings WHERE id = ?", (i,))
+                self._conn.execute("DELETE FROM docs WHERE id = ?", (i,))
+            self._conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 20) -> list[tuple[str, float, Document]]:
+        """Top-k (id, score, Document) by BM25."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs, total_len = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            avgdl = total_len / n_docs
+            scores: dict[str, float] = {}
+            for term in terms:
+                row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    continue
+                idf = math.log(1 + (n_docs - row[0] + 0.5) / (row[0] + 0.5))
+                for i, tf, length in self._conn.execute(
+                        "SELECT p.id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.id WHERE p.term = ?", (term,)):
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+            top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            results = []
+            for i, score in top:
+                text, metadata = self._conn.execute("SELECT text, metadata FROM docs WHERE id = ?", (i,)).fetchone()
+                results.append((i, score, Document(page_content=text, metadata=json.loads(metadata))))
+        return results
+
+
+class HybridRetriever:
+    """`invoke(query)` like a vector-store retriever: BM25 and similarity search each return
+    `fetch_k` candidates, fused by reciprocal rank (score = sum of 1 / (rrf_k + rank))."""
+
+    def __init__(self, vectorstore, keyword_index: BM25Index, k: int = 5, fetch_k: int = 20, rrf_k: int = 60):
+        self.vectorstore = vectorstore
+        self.keyword_index = keyword_index
+        self.k = k
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+
+    def invoke(self, query: str) -> list[Document]:
+        fused: dict[str, float] = {}
+        docs: dict[str, Document] = {}
+        # ids are content hashes, so a vector hit maps to the same id as its BM25 hit
+        vector_hits = [(getattr(d, "id", None) or chunk_id(d), d) for d in self.vectorstore.similarity_search(query, k=self.fetch_k)]
+        keyword_hits = [(i, d) for i, _, d in self.keyword_index.search(query, k=self.fetch_k)]
+        for hits in (vector_hits, keyword_hits):
+            for rank, (i, doc) in enumerate(hits, 1):
+                fused[i] = fused.get(i, 0.0) + 1 / (self.rrf_k + rank)
+                docs.setdefault(i, doc)
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[i] for i in best]
@@ -0,0 +1,111 @@
+"""Disk-backed embedding cache shared by ingestion and retrieval (used by 27_agentic_rag.py)."""
+from array import array
+import hashlib
+import sqlite3
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` object; vectors are stored as float32 blobs in SQLite keyed by
+    (model, sha256 of the text), evicted least-recently-used beyond `max_entries`. Queries and
+    documents share the key space, so a query that equals an indexed chunk is free too."""
+
+    def __init__(self, embeddings: Embeddings, path: str = "embedding_cache.sqlite3",
+                 max_entries: int = 200_000, model: str | None = None):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " model TEXT NOT NULL, key BLOB NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embedding_cache_lru ON embedding_cache(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _lookup(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):    # stay under SQLite's bound-parameter limit
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    (self.model, *part)).fetchall()
+                for k, blob in rows:
+                    found[k] = array("f", blob).tolist()
+            if found:
+                now = time.time_ns()
+                self._conn.executemany("UPDATE embedding_cache SET last_used = ? WHERE model = ? AND key = ?",
+                                       [(now, self.model, k) for k in found])
+                self._conn.commit()
+        return found
+
+    def uncached(self, texts: list[str]) -> list[str]:
+        """The distinct texts in `texts` that embed_documents would send to the wrapped model."""
+        keys = {self.key(t): t for t in texts}
+        have = set()
+        ks = list(keys)
+        with self._lock:
+            for start in range(0, len(ks), 500):
+                part = ks[start:start + 500]
+                have.update(r[0] for r in self._conn.execute(
+                    f"SELECT key FROM embedding_cache WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    (self.model, *part)))
+        return [t for k, t in keys.items() if k not in have]
+
+    def _store(self, vectors: dict[bytes, list[float]]) -> None:
+        now = time.time_ns()
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO embedding_cache (model, key, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model, k, array("f", v).tobytes(), now) for k, v in vectors.items()])
+            self._size += cur.rowcount
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embedding_cache WHERE rowid IN "
+                    "(SELECT rowid FROM embedding_cache ORDER BY last_used LIMIT ?)", (excess,))
+                self._size -= excess
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(t) for t in texts]
+        found = self._lookup(list(set(keys)))
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}   # duplicates embedded once
+        self.hits += len(texts) - sum(1 for k in keys if k in missing)
+        self.misses += sum(1 for k in keys if k in missing)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            # round to float32 so a text embeds to the same vector whether cached or not
+            fresh = {k: array("f", v).tolist() for k, v in zip(missing, vectors)}
+            self._store(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        k = self.key(text)
+        found = self._lookup([k])
+        if k in found:
+            self.hits += 1
+            return found[k]
+        self.misses += 1
+        vector = array("f", self.embeddings.embed_query(text)).tolist()
+        self._store({k: vector})
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": self._size,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
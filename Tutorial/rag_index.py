@@ -0,0 +1,272 @@
+"""Incremental indexing of PDFs into a persisted Chroma collection (used by 27_agentic_rag.py).
+
+Every chunk gets an id that is a hash of its source, page and text, and a JSON manifest next to
+the collection records which ids each source contributed. On a sync only chunks whose id is new
+are embedded and upserted, and ids that disappeared are deleted. A source whose file hash and
+index settings are unchanged is skipped without even being parsed, so restarting on an
+unchanged corpus costs no embedding calls.
+
+New chunks are embedded in token-bounded batches, several batches at a time under a shared
+requests/tokens-per-minute limiter with exponential backoff on 429s, and each batch's vectors are
+upserted as soon as they arrive.
+
+Pages are parsed in a process pool in page ranges and stream through the splitter and embedder
+as generators, with a bounded number of ranges and batches in flight, so peak memory does not
+depend on the size of the PDF. Scripts using this must guard their entry point with
+`if __name__ == "__main__":` (worker processes re-import the main module on macOS/Windows).
+
+An optional keyword index (bm25_index.BM25Index) is kept in step with the collection under the
+same chunk ids; chunks already in the collection but not in the keyword index are copied from
+Chroma, so adding one to an existing collection costs no parsing or embedding."""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+UPSERT_BATCH = 256    # well below Chroma's max batch size
+
+# text-embedding-3-small, usage tier 1
+EMBED_REQUESTS_PER_MIN = 3_000
+EMBED_TOKENS_PER_MIN = 1_000_000
+EMBED_BATCH_TOKENS = 20_000     # per request; the API allows up to 300k tokens / 2048 inputs
+EMBED_WORKERS = 4
+EMBED_MAX_RETRIES = 6
+
+PAGES_PER_TASK = 16
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(doc) -> str:
+    key = json.dumps([doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)     # never leave a half-written manifest behind
+
+
+def _load_page_range(path: str, start: int, stop: int) -> list[Document]:
+    """Worker: pages [start, stop) as Documents, with the same text and metadata keys as PyPDFLoader."""
+    reader = PdfReader(path)
+    return [Document(page_content=reader.pages[i].extract_text(), metadata={"source": path, "page": i})
+            for i in range(start, stop)]
+
+
+def iter_pages(path: str, workers: int | None = None, pages_per_task: int = PAGES_PER_TASK):
+    """Yield the PDF's pages in order, parsing page ranges in `workers` processes (1: in-process)."""
+    n_pages = len(PdfReader(path).pages)
+    print(f"PDF has {n_pages} pages")
+    ranges = [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for start, stop in ranges:
+            yield from _load_page_range(path, start, stop)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        todo = iter(ranges)
+        while True:
+            while len(pending) < 2 * workers and (r := next(todo, None)) is not None:
+                pending.append(pool.submit(_load_page_range, path, *r))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
+
+def iter_chunks(pages, text_splitter):
+    """Split page by page (what split_documents does for a list) without holding every page."""
+    for page in pages:
+        yield from text_splitter.split_documents([page])
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // 4 + 1    # ~4 characters per token for English; only used for budgeting
+
+
+def token_batches(items, max_tokens: int = EMBED_BATCH_TOKENS, max_items: int = 2048):
+    """Group (id, doc) pairs into (docs, ids, tokens) batches of at most `max_tokens` (a longer
+    single chunk goes alone)."""
+    group, group_ids, tokens = [], [], 0
+    for i, doc in items:
+        n = approx_tokens(doc.page_content)
+        if group and (tokens + n > max_tokens or len(group) == max_items):
+            yield group, group_ids, tokens
+            group, group_ids, tokens = [], [], 0
+        group.append(doc)
+        group_ids.append(i)
+        tokens += n
+    if group:
+        yield group, group_ids, tokens
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute budget shared by all embedding threads (two token buckets)."""
+
+    def __init__(self, requests_per_min: float = EMBED_REQUESTS_PER_MIN, tokens_per_min: float = EMBED_TOKENS_PER_MIN):
+        self.rates = (requests_per_min / 60, tokens_per_min / 60)
+        self.levels = [requests_per_min / 60, tokens_per_min / 60]   # start with one second of budget
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        need = (1, min(tokens, self.rates[1] * 60))
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for j, rate in enumerate(self.rates):
+                    self.levels[j] = min(rate * 60, self.levels[j] + (now - self.stamp) * rate)
+                self.stamp = now
+                wait_s = max((need[j] - self.levels[j]) / self.rates[j] for j in range(2))
+                if wait_s <= 0:
+                    self.levels[0] -= need[0]
+                    self.levels[1] -= need[1]
+                    return
+            time.sleep(wait_s)
+
+
+def _is_rate_limit(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def _embed_with_backoff(embeddings, texts: list[str], tokens: int, limiter: RateLimiter) -> list[list[float]]:
+    uncached = getattr(embeddings, "uncached", None)     # embedding_cache.CachedEmbeddings
+    if uncached is not None:
+        # cache hits make no API call: charge the limiter only for the texts that miss
+        tokens = sum(approx_tokens(t) for t in uncached(texts))
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        if tokens:
+            limiter.acquire(tokens)
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if not _is_rate_limit(e) or attempt == EMBED_MAX_RETRIES:
+                raise
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+            delay = float(retry_after) if retry_after else min(60.0, 2 ** attempt)
+            time.sleep(delay * random.uniform(1.0, 1.5))
+
+
+def embed_and_upsert(vectorstore, items, workers: int = EMBED_WORKERS, limiter: RateLimiter | None = None,
+                     keyword_index=None) -> int:
+    """Embed (id, doc) pairs in concurrent token-bounded batches and upsert each batch's vectors
+    into the Chroma collection (and `keyword_index`, if given) as soon as it is ready, printing
+    progress. `items` may be a generator; it is consumed only as fast as batches complete.
+    Returns the number embedded."""
+    limiter = limiter or RateLimiter()
+    embeddings = vectorstore.embeddings
+    batches = token_batches(items)
+    done, start = 0, time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        in_flight = {}
+        while True:
+            # keep a bounded number of batches in flight so memory does not grow with the corpus
+            while len(in_flight) < 2 * workers:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                group, group_ids, tokens = batch
+                fut = pool.submit(_embed_with_backoff, embeddings, [d.page_content for d in group], tokens, limiter)
+                in_flight[fut] = (group, group_ids)
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                group, group_ids = in_flight.pop(fut)
+                vectorstore._collection.upsert(
+                    ids=group_ids,
+                    embeddings=fut.result(),
+                    documents=[d.page_content for d in group],
+                    metadatas=[d.metadata or None for d in group],
+                )
+                if keyword_index is not None:
+                    keyword_index.add(group_ids, group)
+                done += len(group)
+                print(f"\rEmbedded {done} chunks ({done / (time.perf_counter() - start):.0f}/s)", end="", flush=True)
+    if done:
+        print()
+    return done
+
+
+def _backfill_keyword_index(vectorstore, keyword_index, ids: list[str]) -> None:
+    missing = keyword_index.missing(ids)
+    for start in range(0, len(missing), UPSERT_BATCH):
+        got = vectorstore._collection.get(ids=missing[start:start + UPSERT_BATCH], include=["documents", "metadatas"])
+        keyword_index.add(got["ids"], [Document(page_content=text, metadata=meta or {})
+                                       for text, meta in zip(got["documents"], got["metadatas"])])
+
+
+def sync_pdf(pdf_path: str, vectorstore, text_splitter, manifest_path: str, settings: dict,
+             load_workers: int | None = None, keyword_index=None) -> dict:
+    """Bring the collection in line with `pdf_path`; returns counts of added / removed / kept chunks.
+
+    `settings` (embedding model, splitter parameters ...) is stored in the manifest; when it changes,
+    every vector the manifest knows about is dropped and the source is indexed again."""
+    manifest = load_manifest(manifest_path)
+    if manifest.get("settings") != settings:
+        stale = [i for entry in manifest.get("sources", {}).values() for i in entry["ids"]]
+        for start in range(0, len(stale), UPSERT_BATCH):
+            vectorstore.delete(ids=stale[start:start + UPSERT_BATCH])
+        if keyword_index is not None:
+            keyword_index.delete(stale)
+        manifest = {"settings": settings, "sources": {}}
+
+    source = os.path.abspath(pdf_path)
+    entry = manifest["sources"].get(source, {"sha256": None, "ids": []})
+    digest = file_digest(pdf_path)
+    indexed = set(entry["ids"])
+    # the collection can be wiped independently of the manifest; only trust a matching count
+    in_store = vectorstore._collection.count() >= sum(len(e["ids"]) for e in manifest["sources"].values())
+    if entry["sha256"] == digest and in_store:
+        if keyword_index is not None:
+            _backfill_keyword_index(vectorstore, keyword_index, entry["ids"])
+        return {"added": 0, "removed": 0, "kept": len(indexed), "parsed": False}
+    if not in_store:
+        indexed = set()
+
+    seen: dict[str, None] = {}    # ids in document order; only ids are kept, not chunk texts
+
+    def new_chunks():
+        for doc in iter_chunks(iter_pages(pdf_path, load_workers), text_splitter):
+            i = chunk_id(doc)
+            if i not in seen:
+                seen[i] = None
+                if i not in indexed:
+                    yield i, doc
+
+    added = embed_and_upsert(vectorstore, new_chunks(), keyword_index=keyword_index)
+    removed = [i for i in indexed if i not in seen]
+    for start in range(0, len(removed), UPSERT_BATCH):
+        vectorstore.delete(ids=removed[start:start + UPSERT_BATCH])
+    if keyword_index is not None:
+        # kept chunks may predate the keyword index; drop what the old manifest had and the PDF no longer does
+        _backfill_keyword_index(vectorstore, keyword_index, [i for i in seen if i in indexed])
+        keyword_index.delete([i for i in entry["ids"] if i not in seen])
+
+    manifest["sources"][source] = {"sha256": digest, "ids": list(seen)}
+    save_manifest(manifest_path, manifest)
+    return {"added": added, "removed": len(removed), "kept": len(seen) - added, "parsed": True}